@@ -0,0 +1,83 @@
+"""Bearer token verification with a decoded-token cache.
+
+Tokens are the HS256 JWTs issued by ``create_token`` in server.py. Decoding
+and checking the HMAC on every request is cheap but not free, so verified
+tokens are kept in a small LRU keyed by their signature until they expire.
+A hit still compares the full token, so a reused signature with a different
+header or payload never matches.
+"""
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Optional
+
+from jose import JWTError, jwt
+
+
+class InvalidToken(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class Principal:
+    email: str
+    expires_at: float
+    claims: dict = field(default_factory=dict, compare=False)
+
+
+class TokenVerifier:
+    def __init__(self, secret: str, algorithm: str = "HS256", maxsize: int = 10000):
+        self.secret = secret
+        self.algorithm = algorithm
+        self.maxsize = maxsize
+        self._cache: "OrderedDict[str, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.rejected = 0
+
+    def _cached(self, signature: str, token: str) -> Optional[Principal]:
+        entry = self._cache.get(signature)
+        if entry is None:
+            return None
+        cached_token, principal = entry
+        if cached_token != token:
+            return None
+        if principal.expires_at <= time.time():
+            del self._cache[signature]
+            return None
+        self._cache.move_to_end(signature)
+        return principal
+
+    def verify(self, token: str) -> Principal:
+        signature = token.rsplit(".", 1)[-1]
+        principal = self._cached(signature, token)
+        if principal is not None:
+            self.hits += 1
+            return principal
+        self.misses += 1
+
+        try:
+            claims = jwt.decode(token, self.secret, algorithms=[self.algorithm])
+        except JWTError as e:
+            self.rejected += 1
+            raise InvalidToken(str(e))
+        email, exp = claims.get("sub"), claims.get("exp")
+        if not isinstance(email, str) or not isinstance(exp, (int, float)):
+            self.rejected += 1
+            raise InvalidToken("Token is missing sub or exp")
+
+        principal = Principal(email=email, expires_at=float(exp), claims=claims)
+        self._cache[signature] = (token, principal)
+        self._cache.move_to_end(signature)
+        while len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+        return principal
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._cache),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,363 @@
+"""Load-test and benchmark harness for server.py.
+
+Boots the app in-process (or targets a running server with --base-url), seeds
+realistic data volumes, drives each workload scenario with N concurrent
+clients and prints one JSON report with throughput, latency percentiles and
+memory per scenario, suitable for diffing between releases.
+
+    python bench.py --scale 0.01 --duration 20 --concurrency 32 --output bench.json
+    python bench.py --in-memory --scale 0.001          # mongomock stand-in, no mongod
+    python bench.py --base-url http://localhost:8001   # against a deployed server
+
+Seeding first empties the seeded collections in the configured DB_NAME, so
+it refuses to run unless the name ends in "_bench" (e.g.
+DB_NAME=emerald_orbit_bench) or --i-know-this-wipes is given. With --base-url
+the server's existing data is used unless --reseed is given.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import sys
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import httpx
+
+# Full production-like volumes; --scale multiplies these.
+FULL_VOLUMES = {
+    "users": 10_000,
+    "call_history": 1_000_000,
+    "chat_messages": 5_000_000,
+    "properties": 100_000,
+}
+SEED_BATCH = 5_000
+SCRATCH_DB_SUFFIX = "_bench"
+BENCH_PASSWORD = "bench-password"
+CITIES = [("Austin", "TX"), ("Denver", "CO"), ("Miami", "FL"), ("Seattle", "WA"), ("Boston", "MA")]
+PROPERTY_TYPES = ["house", "condo", "townhouse", "land"]
+STATUSES = ["for_sale", "for_rent", "sold"]
+CALL_STATUSES = ["completed", "missed", "declined"]
+
+
+def _iso(dt: datetime) -> str:
+    return dt.isoformat()
+
+
+def _user_email(i: int) -> str:
+    return f"bench{i}@example.com"
+
+
+async def _insert(collection, make, total: int):
+    for start in range(0, total, SEED_BATCH):
+        docs = [make(i) for i in range(start, min(start + SEED_BATCH, total))]
+        await collection.insert_many(docs, ordered=False)
+
+
+async def seed(server, scale: float) -> dict:
+    volumes = {name: max(1, int(count * scale)) for name, count in FULL_VOLUMES.items()}
+    users = volumes["users"]
+    now = datetime.now(timezone.utc)
+    # One hash for every seeded user; hashing 10k passwords would dominate seeding
+    hashed = server.pwd_context.hash(BENCH_PASSWORD)
+
+    for col in (server.users_col, server.subscriptions_col, server.call_history_col,
+                server.messages_col, server.properties_col, server.presence_col):
+        await col.delete_many({})
+    await server.ensure_indexes(server.db)
+
+    await _insert(server.users_col, lambda i: {
+        "id": str(uuid.uuid4()),
+        "email": _user_email(i),
+        "full_name": f"Bench User {i}",
+        "hashed_password": hashed,
+        "role": "user",
+        "is_active": True,
+        "created_at": _iso(now - timedelta(minutes=i)),
+    }, users)
+
+    def call(i):
+        started = now - timedelta(seconds=i * 7)
+        return {
+            "id": str(uuid.uuid4()),
+            "callId": str(uuid.uuid4()),
+            "callerId": f"user-{random.randrange(users)}",
+            "calleeId": f"user-{random.randrange(users)}",
+            "status": random.choice(CALL_STATUSES),
+            "startedAt": _iso(started),
+            "endedAt": _iso(started + timedelta(seconds=random.randint(5, 1800))),
+            "durationSeconds": float(random.randint(5, 1800)),
+            "metadata": {},
+            "createdAt": _iso(started),
+        }
+    await _insert(server.call_history_col, call, volumes["call_history"])
+
+    def message(i):
+        a, b = random.randrange(users), random.randrange(users)
+        return {
+            "id": str(uuid.uuid4()),
+            "sender_email": _user_email(a),
+            "sender_name": f"Bench User {a}",
+            "receiver_email": _user_email(b),
+            "conversation_key": server.conversation_key(_user_email(a), _user_email(b)),
+            "message": "x" * random.randint(10, 200),
+            "read": False,
+            "created_date": _iso(now - timedelta(seconds=i)),
+        }
+    await _insert(server.messages_col, message, volumes["chat_messages"])
+
+    def prop(i):
+        city, state = random.choice(CITIES)
+        return {
+            "id": str(uuid.uuid4()),
+            "title": f"Listing {i}",
+            "address": f"{i} Main St",
+            "city": city,
+            "state": state,
+            "zip_code": f"{random.randint(10000, 99999)}",
+            "price": float(random.randint(50, 2000) * 1000),
+            "property_type": random.choice(PROPERTY_TYPES),
+            "status": random.choice(STATUSES),
+            "bedrooms": random.randint(0, 6),
+            "bathrooms": random.randint(1, 8) / 2,
+            "sqft": random.randint(400, 6000),
+            "images": [f"https://img.example.com/{i}/{n}.jpg" for n in range(8)],
+            "features": ["garage", "pool", "garden"][: random.randint(0, 3)],
+            "description": "A bench listing. " * 20,
+            "user_email": _user_email(random.randrange(users)),
+            "created_date": _iso(now - timedelta(minutes=i)),
+        }
+    await _insert(server.properties_col, prop, volumes["properties"])
+    return volumes
+
+
+# ==================== SCENARIOS ====================
+# Each scenario is an async callable taking (client, rng, users) and issuing
+# one logical operation; it returns the HTTP status of the last request.
+
+async def scenario_login(client, rng, users):
+    r = await client.post("/api/auth/login", json={"email": _user_email(rng.randrange(users)), "password": BENCH_PASSWORD})
+    return r.status_code
+
+
+async def scenario_messaging(client, rng, users):
+    me, other = _user_email(rng.randrange(users)), _user_email(rng.randrange(users))
+    if rng.random() < 0.5:
+        r = await client.post(f"/api/messages?user_email={me}", json={"receiver_email": other, "message": "hello"})
+    else:
+        r = await client.get("/api/messages", params={"user_email": me, "other_email": other, "limit": 50})
+    return r.status_code
+
+
+async def scenario_presence(client, rng, users):
+    if rng.random() < 0.9:
+        r = await client.post("/api/presence", params={"user_email": _user_email(rng.randrange(users))})
+    else:
+        r = await client.get("/api/presence", params={"limit": 100})
+    return r.status_code
+
+
+async def scenario_property_search(client, rng, users):
+    params = {"limit": 24, "sort": rng.choice(["newest", "price_asc", "price_desc"])}
+    if rng.random() < 0.7:
+        params["status"] = rng.choice(STATUSES)
+    if rng.random() < 0.5:
+        params["city"], params["state"] = rng.choice(CITIES)
+    if rng.random() < 0.5:
+        low = rng.randint(50, 1000) * 1000
+        params["min_price"], params["max_price"] = low, low + 500_000
+    if rng.random() < 0.3:
+        params["min_bedrooms"] = rng.randint(1, 4)
+    r = await client.get("/api/properties/search", params=params)
+    return r.status_code
+
+
+def _call_payload(rng, users):
+    started = datetime.now(timezone.utc) - timedelta(seconds=rng.randint(10, 3600))
+    return {
+        "callId": str(uuid.uuid4()),
+        "callerId": f"user-{rng.randrange(users)}",
+        "calleeId": f"user-{rng.randrange(users)}",
+        "status": rng.choice(CALL_STATUSES),
+        "startedAt": _iso(started),
+        "endedAt": _iso(started + timedelta(seconds=rng.randint(5, 600))),
+    }
+
+
+async def scenario_call_ingest(client, rng, users):
+    r = await client.post("/api/call-history", json=_call_payload(rng, users))
+    return r.status_code
+
+
+async def scenario_call_ingest_batch(client, rng, users):
+    r = await client.post("/api/call-history:batch", json=[_call_payload(rng, users) for _ in range(100)])
+    return r.status_code
+
+
+MIX = [
+    (scenario_messaging, 35),
+    (scenario_presence, 35),
+    (scenario_property_search, 15),
+    (scenario_call_ingest, 10),
+    (scenario_login, 5),
+]
+
+
+async def scenario_mixed(client, rng, users):
+    fn = rng.choices([f for f, _ in MIX], weights=[w for _, w in MIX])[0]
+    return await fn(client, rng, users)
+
+
+SCENARIOS = {
+    "login": scenario_login,
+    "messaging": scenario_messaging,
+    "presence": scenario_presence,
+    "property_search": scenario_property_search,
+    "call_ingest": scenario_call_ingest,
+    "call_ingest_batch": scenario_call_ingest_batch,
+    "mixed": scenario_mixed,
+}
+
+
+def percentile(sorted_values: list, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100.0 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+async def run_scenario(client, name: str, users: int, duration: float, concurrency: int, seed_value: int) -> dict:
+    fn = SCENARIOS[name]
+    latencies = []
+    statuses: dict = {}
+    deadline = time.perf_counter() + duration
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    tracemalloc.start()
+
+    async def worker(worker_id: int):
+        rng = random.Random(seed_value * 1000 + worker_id)
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                status = await fn(client, rng, users)
+            except httpx.HTTPError:
+                status = "error"
+            latencies.append(time.perf_counter() - start)
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies.sort()
+    errors = sum(count for status, count in statuses.items() if not status.startswith("2"))
+    ms = lambda v: round(v * 1000, 3)
+    return {
+        "scenario": name,
+        "requests": len(latencies),
+        "errors": errors,
+        "statuses": statuses,
+        "duration_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {
+            "p50": ms(percentile(latencies, 50)),
+            "p95": ms(percentile(latencies, 95)),
+            "p99": ms(percentile(latencies, 99)),
+            "max": ms(latencies[-1]) if latencies else 0.0,
+        },
+        "memory": {
+            "python_peak_mb": round(peak / 1_048_576, 2),
+            # ru_maxrss is KiB on Linux, bytes on macOS
+            "max_rss_growth_mb": round((resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before)
+                                       / (1_048_576 if sys.platform == "darwin" else 1024), 2),
+        },
+    }
+
+
+def _use_in_memory_mongo():
+    try:
+        import mongomock_motor
+    except ImportError:
+        sys.exit("--in-memory needs the mongomock-motor package (pip install mongomock-motor)")
+    import motor.motor_asyncio
+    motor.motor_asyncio.AsyncIOMotorClient = mongomock_motor.AsyncMongoMockClient
+
+
+async def main(args) -> dict:
+    if args.in_memory:
+        _use_in_memory_mongo()
+    import server
+
+    volumes = None
+    if not args.skip_seed and (args.reseed or not args.base_url):
+        db_name = server.db.name
+        if not (args.in_memory or db_name.endswith(SCRATCH_DB_SUFFIX) or args.i_know_this_wipes):
+            sys.exit(f"Refusing to seed {db_name!r}: seeding empties its users, subscriptions, calls, "
+                     f"messages, properties and presence. Use a DB_NAME ending in {SCRATCH_DB_SUFFIX!r}, "
+                     f"--skip-seed, or --i-know-this-wipes.")
+        seed_started = time.perf_counter()
+        volumes = await seed(server, args.scale)
+        seed_seconds = round(time.perf_counter() - seed_started, 2)
+    users = max(1, int(FULL_VOLUMES["users"] * args.scale))
+
+    if args.base_url:
+        client = httpx.AsyncClient(base_url=args.base_url, timeout=30)
+    else:
+        await server.app.router.startup()
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app), base_url="http://bench", timeout=30)
+
+    results = []
+    try:
+        for name in args.scenarios:
+            results.append(await run_scenario(client, name, users, args.duration, args.concurrency, args.seed))
+    finally:
+        await client.aclose()
+        if not args.base_url:
+            await server.app.router.shutdown()
+
+    return {
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "target": args.base_url or "in-process",
+        "mongo": "mongomock" if args.in_memory else os.environ.get("MONGO_URL"),
+        "config": {"scale": args.scale, "duration_s": args.duration, "concurrency": args.concurrency, "seed": args.seed},
+        "seeded": volumes,
+        "seed_seconds": seed_seconds if volumes else None,
+        "scenarios": results,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", type=float, default=0.01, help="fraction of FULL_VOLUMES to seed")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per scenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--scenarios", nargs="+", default=list(SCENARIOS), choices=list(SCENARIOS))
+    parser.add_argument("--seed", type=int, default=42, help="RNG seed for reproducible request mixes")
+    parser.add_argument("--base-url", help="benchmark a running server instead of booting the app in-process")
+    parser.add_argument("--in-memory", action="store_true", help="use mongomock instead of MONGO_URL")
+    parser.add_argument("--skip-seed", action="store_true", help="reuse data from a previous run")
+    parser.add_argument("--reseed", action="store_true", help="seed DB_NAME even with --base-url")
+    parser.add_argument("--i-know-this-wipes", action="store_true",
+                        help=f"allow seeding a DB_NAME that doesn't end in {SCRATCH_DB_SUFFIX!r}")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    random.seed(args.seed)
+    report = asyncio.run(main(args))
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
@@ -0,0 +1,342 @@
+"""Content-addressed storage for large document payloads.
+
+Projects and creator assets keep small ``data`` payloads inline. Anything over
+the spill threshold is written here and the document keeps a reference:
+
+    {"store": "gridfs", "sha256": "...", "size": 123456, "content_type": "application/json"}
+
+Payloads are keyed by their SHA-256, so identical uploads (autosave of an
+unchanged scene, duplicated templates) are stored once. Two stores share the
+same interface:
+
+* ``GridFSBlobStore``: chunks in a Mongo GridFS bucket (the default).
+* ``LocalBlobStore``: files on local disk, for single-node or dev setups.
+
+Since blobs are shared, they are not deleted along with a document. The
+server instead checks whether anything still references a replaced blob,
+and a periodic sweep removes the rest. Each upload that lands on an existing
+hash "touches" the blob, and only blobs untouched for a grace period are
+deleted. That way a blob is never removed between a deduplicated upload and
+the write that records its reference.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import AsyncIterator, Awaitable, Callable, List, Optional
+
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+from pymongo.errors import PyMongoError
+
+logger = logging.getLogger(__name__)
+
+READ_CHUNK_SIZE = 256 * 1024
+
+
+class BlobNotFound(Exception):
+    pass
+
+
+class BlobTooLarge(Exception):
+    pass
+
+
+def blob_ref(store: str, sha256: str, size: int, content_type: str) -> dict:
+    return {"store": store, "sha256": sha256, "size": size, "content_type": content_type}
+
+
+async def _limited(chunks: AsyncIterator[bytes], max_size: Optional[int]) -> AsyncIterator[bytes]:
+    total = 0
+    async for chunk in chunks:
+        total += len(chunk)
+        if max_size is not None and total > max_size:
+            raise BlobTooLarge(max_size)
+        yield chunk
+
+
+async def _digest(digest, data: bytes):
+    """Hash data into digest, off the event loop when it is more than a read chunk."""
+    if len(data) > READ_CHUNK_SIZE:
+        await asyncio.to_thread(digest.update, data)
+    else:
+        digest.update(data)
+    return digest
+
+
+def _utc(timestamp: float) -> datetime:
+    return datetime.fromtimestamp(timestamp, timezone.utc)
+
+
+class GridFSBlobStore:
+    name = "gridfs"
+
+    def __init__(self, db, bucket_name: str = "payloads"):
+        self.db = db
+        self.bucket_name = bucket_name
+        self.files = db[f"{bucket_name}.files"]
+        self._bucket = None
+
+    @property
+    def bucket(self) -> AsyncIOMotorGridFSBucket:
+        # built on first use so importing the server doesn't need a real
+        # Motor database (bench.py --in-memory runs on mongomock)
+        if self._bucket is None:
+            self._bucket = AsyncIOMotorGridFSBucket(self.db, bucket_name=self.bucket_name)
+        return self._bucket
+
+    async def _find(self, sha256: str):
+        files = await self.bucket.find({"filename": sha256}, limit=1).to_list(1)
+        return files[0] if files else None
+
+    async def _touch(self, file_id):
+        await self.files.update_one({"_id": file_id}, {"$set": {"metadata.touched_at": datetime.now(timezone.utc)}})
+
+    def _stale_filter(self, older_than: float) -> dict:
+        cutoff = _utc(older_than)
+        return {"uploadDate": {"$lt": cutoff}, "metadata.touched_at": {"$not": {"$gte": cutoff}}}
+
+    async def put_stream(self, chunks: AsyncIterator[bytes], content_type: str = "application/json",
+                         max_size: Optional[int] = None) -> dict:
+        digest = hashlib.sha256()
+        size = 0
+        # written under a temporary name; renamed to its hash once known
+        grid_in = self.bucket.open_upload_stream(f"pending-{uuid.uuid4()}", metadata={"content_type": content_type})
+        try:
+            async for chunk in _limited(chunks, max_size):
+                await _digest(digest, chunk)
+                size += len(chunk)
+                await grid_in.write(chunk)
+            await grid_in.close()
+        except BaseException:
+            await grid_in.abort()
+            raise
+        sha256 = digest.hexdigest()
+        existing = await self._find(sha256)
+        if existing is not None:
+            await self._touch(existing._id)
+            await self.bucket.delete(grid_in._id)
+        else:
+            await self.bucket.rename(grid_in._id, sha256)
+        return blob_ref(self.name, sha256, size, content_type)
+
+    async def put(self, data: bytes, content_type: str = "application/json") -> dict:
+        sha256 = (await _digest(hashlib.sha256(), data)).hexdigest()
+        existing = await self._find(sha256)
+        if existing is not None:
+            await self._touch(existing._id)
+        else:
+            await self.bucket.upload_from_stream(sha256, data, metadata={"content_type": content_type})
+        return blob_ref(self.name, sha256, len(data), content_type)
+
+    async def delete_if_stale(self, sha256: str, older_than: float) -> bool:
+        """Delete the blob unless it was written or touched after older_than."""
+        found = await self.files.find_one({"filename": sha256, **self._stale_filter(older_than)}, {"_id": 1})
+        if found is None:
+            return False
+        await self.bucket.delete(found["_id"])
+        return True
+
+    async def stale(self, older_than: float) -> AsyncIterator[str]:
+        query = {"filename": {"$not": re.compile("^pending-")}, **self._stale_filter(older_than)}
+        async for doc in self.files.find(query, {"_id": 0, "filename": 1}):
+            yield doc["filename"]
+
+    async def purge_abandoned(self, older_than: float) -> int:
+        """Remove uploads that never finished (e.g. the worker died mid-stream)."""
+        query = {"filename": re.compile("^pending-"), "uploadDate": {"$lt": _utc(older_than)}}
+        ids = [doc["_id"] async for doc in self.files.find(query, {"_id": 1})]
+        for file_id in ids:
+            await self.bucket.delete(file_id)
+        return len(ids)
+
+    async def open(self, sha256: str, start: int = 0, end: Optional[int] = None) -> AsyncIterator[bytes]:
+        """Look the blob up, then return an iterator over bytes [start, end]
+        (inclusive), so a missing blob fails before any response is sent."""
+        found = await self._find(sha256)
+        if found is None:
+            raise BlobNotFound(sha256)
+        grid_out = await self.bucket.open_download_stream(found._id)
+        return self._iter(grid_out, start, grid_out.length - 1 if end is None else end)
+
+    async def _iter(self, grid_out, start: int, end: int) -> AsyncIterator[bytes]:
+        remaining = end + 1 - start
+        grid_out.seek(start)
+        while remaining > 0:
+            chunk = await grid_out.read(min(READ_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+class LocalBlobStore:
+    name = "local"
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(os.path.join(root, "tmp"), exist_ok=True)
+
+    def _path(self, sha256: str) -> str:
+        return os.path.join(self.root, sha256[:2], sha256)
+
+    def _commit(self, tmp_path: str, sha256: str):
+        path = self._path(sha256)
+        if os.path.exists(path):
+            os.utime(path)
+            os.remove(tmp_path)
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp_path, path)
+
+    async def put_stream(self, chunks: AsyncIterator[bytes], content_type: str = "application/json",
+                         max_size: Optional[int] = None) -> dict:
+        digest = hashlib.sha256()
+        size = 0
+        tmp_path = os.path.join(self.root, "tmp", str(uuid.uuid4()))
+        handle = await asyncio.to_thread(open, tmp_path, "wb")
+        try:
+            async for chunk in _limited(chunks, max_size):
+                await _digest(digest, chunk)
+                size += len(chunk)
+                await asyncio.to_thread(handle.write, chunk)
+        except BaseException:
+            handle.close()
+            os.remove(tmp_path)
+            raise
+        await asyncio.to_thread(handle.close)
+        sha256 = digest.hexdigest()
+        await asyncio.to_thread(self._commit, tmp_path, sha256)
+        return blob_ref(self.name, sha256, size, content_type)
+
+    async def put(self, data: bytes, content_type: str = "application/json") -> dict:
+        async def single():
+            yield data
+        return await self.put_stream(single(), content_type)
+
+    async def open(self, sha256: str, start: int = 0, end: Optional[int] = None) -> AsyncIterator[bytes]:
+        try:
+            handle = await asyncio.to_thread(open, self._path(sha256), "rb")
+        except FileNotFoundError:
+            raise BlobNotFound(sha256)
+        if end is None:
+            end = os.fstat(handle.fileno()).st_size - 1
+        return self._iter(handle, start, end)
+
+    async def _iter(self, handle, start: int, end: int) -> AsyncIterator[bytes]:
+        try:
+            await asyncio.to_thread(handle.seek, start)
+            remaining = end + 1 - start
+            while remaining > 0:
+                chunk = await asyncio.to_thread(handle.read, min(READ_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+        finally:
+            handle.close()
+
+    def _delete_if_stale(self, path: str, older_than: float) -> bool:
+        try:
+            if os.stat(path).st_mtime >= older_than:
+                return False
+            os.remove(path)
+        except FileNotFoundError:
+            return False
+        return True
+
+    async def delete_if_stale(self, sha256: str, older_than: float) -> bool:
+        """Delete the blob unless it was written or touched after older_than."""
+        return await asyncio.to_thread(self._delete_if_stale, self._path(sha256), older_than)
+
+    def _list_stale(self, older_than: float) -> List[str]:
+        found = []
+        for prefix in os.listdir(self.root):
+            directory = os.path.join(self.root, prefix)
+            if prefix == "tmp" or not os.path.isdir(directory):
+                continue
+            for entry in os.scandir(directory):
+                if entry.stat().st_mtime < older_than:
+                    found.append(entry.name)
+        return found
+
+    async def stale(self, older_than: float) -> AsyncIterator[str]:
+        for sha256 in await asyncio.to_thread(self._list_stale, older_than):
+            yield sha256
+
+    async def purge_abandoned(self, older_than: float) -> int:
+        """Remove uploads that never finished (e.g. the worker died mid-stream)."""
+        directory = os.path.join(self.root, "tmp")
+
+        def purge() -> int:
+            removed = 0
+            for entry in os.scandir(directory):
+                if entry.stat().st_mtime < older_than:
+                    os.remove(entry.path)
+                    removed += 1
+            return removed
+        return await asyncio.to_thread(purge)
+
+
+class BlobCollector:
+    """Deletes blobs that no document references. ``release`` runs when a
+    document drops a blob (replaced or deleted); the periodic sweep catches
+    whatever release had to skip because the blob was still inside the grace
+    period, plus uploads abandoned halfway."""
+
+    def __init__(self, store, is_referenced: Callable[[str], Awaitable[bool]],
+                 grace: float = 600.0, interval: float = 3600.0):
+        self.store = store
+        self.is_referenced = is_referenced
+        self.grace = grace
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+        self.deleted = 0
+        self.abandoned = 0
+        self.sweeps = 0
+
+    async def release(self, ref: Optional[dict]):
+        if not ref or ref.get("store") != self.store.name:
+            return
+        if not await self.is_referenced(ref["sha256"]):
+            if await self.store.delete_if_stale(ref["sha256"], time.time() - self.grace):
+                self.deleted += 1
+
+    async def sweep(self) -> dict:
+        older_than = time.time() - self.grace
+        deleted = 0
+        async for sha256 in self.store.stale(older_than):
+            if not await self.is_referenced(sha256) and await self.store.delete_if_stale(sha256, older_than):
+                deleted += 1
+        abandoned = await self.store.purge_abandoned(older_than)
+        self.deleted += deleted
+        self.abandoned += abandoned
+        self.sweeps += 1
+        return {"deleted": deleted, "abandoned": abandoned}
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.sweep()
+            except (PyMongoError, OSError) as e:
+                logger.warning("Blob sweep failed, retrying next cycle: %s", e)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {"store": self.store.name, "sweeps": self.sweeps, "deleted": self.deleted, "abandoned": self.abandoned}
@@ -0,0 +1,98 @@
+"""In-process LRU + TTL cache with single-flight loading.
+
+Concurrent misses for the same key share one loader call instead of each
+hitting Mongo. Everything runs on the event loop, so no locks are needed
+around the OrderedDict.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable
+
+
+class TTLCache:
+    def __init__(self, maxsize: int = 10000, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._inflight: dict = {}
+        self._stale: set = set()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            return default
+        value, expires = entry
+        if expires < time.monotonic():
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any):
+        self._data[key] = (value, time.monotonic() + self.ttl)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: Hashable):
+        self._data.pop(key, None)
+        # A load already in flight started before this write; don't let it
+        # repopulate the cache with the stale value.
+        if key in self._inflight:
+            self._stale.add(key)
+
+    def clear(self):
+        self._data.clear()
+        self._stale.update(self._inflight)
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        entry = self._data.get(key)
+        if entry is not None and entry[1] >= time.monotonic():
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+        self.misses += 1
+        future = self._inflight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await loader()
+        except BaseException as e:
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+                # Mark retrieved so waiter-less failures don't log "never retrieved"
+                future.exception()
+            raise
+        else:
+            if key not in self._stale:
+                self.set(key, value)
+            future.set_result(value)
+            return value
+        finally:
+            del self._inflight[key]
+            self._stale.discard(key)
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "inflight": len(self._inflight),
+        }
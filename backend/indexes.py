@@ -0,0 +1,176 @@
+"""Declarative index registry for the collections queried by server.py.
+
+Each entry mirrors the filter and sort shape of the routes that hit the
+collection. ``ensure_indexes`` runs at app startup; ``index_report`` backs the
+admin endpoint and the CLI:
+
+    python indexes.py report
+    python indexes.py ensure
+"""
+import asyncio
+import json
+import logging
+import os
+import sys
+
+from pymongo import ASCENDING, DESCENDING, GEOSPHERE, IndexModel
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+
+def _id_index() -> IndexModel:
+    return IndexModel([("id", ASCENDING)], name="id_unique", unique=True)
+
+
+def _keyset(*prefix: str, sort_field: str = "created_date", direction: int = DESCENDING) -> IndexModel:
+    """Equality prefix followed by the (sort_field, id) keyset used by pagination."""
+    keys = [(field, ASCENDING) for field in prefix] + [(sort_field, direction), ("id", direction)]
+    return IndexModel(keys, name="_".join(list(prefix) + [sort_field, "id"]))
+
+
+def _payload_ref_index() -> IndexModel:
+    # blob GC asks whether anything still points at a hash
+    return IndexModel([("data_ref.sha256", ASCENDING)], name="data_ref_sha256", sparse=True)
+
+
+INDEX_REGISTRY = {
+    "users": [
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+        _id_index(),
+        _keyset(sort_field="created_at"),
+    ],
+    "contacts": [_keyset("user_email"), _id_index()],
+    # calls_col and call_history_col share this collection
+    "call_history": [
+        _keyset("user_email"),
+        _keyset("callerId", sort_field="createdAt"),
+        _keyset("calleeId", sort_field="createdAt"),
+        _keyset(sort_field="createdAt"),
+        _id_index(),
+    ],
+    "songs": [_keyset("user_email"), _keyset(), _id_index()],
+    # Search indexes follow equality, sort, range: exact-match filters first,
+    # then the sort key, with price/bedroom/sqft ranges applied on the scan.
+    "properties": [
+        _keyset("status", "property_type"),
+        _keyset("property_type"),
+        _keyset(),
+        _keyset("status", "property_type", sort_field="price", direction=ASCENDING),
+        _keyset("status", sort_field="price", direction=ASCENDING),
+        _keyset("city", "state", sort_field="price", direction=ASCENDING),
+        _keyset("city", "state"),
+        _keyset("zip_code", sort_field="price", direction=ASCENDING),
+        _keyset(sort_field="price", direction=ASCENDING),
+        _keyset(sort_field="sqft"),
+        # map queries: $geoNear / $geoWithin, with status and price narrowed in the index
+        IndexModel([("location", GEOSPHERE), ("status", ASCENDING), ("price", ASCENDING)], name="location_2dsphere_status_price"),
+        _id_index(),
+    ],
+    "subscriptions": [_keyset("user_email"), _keyset(), _id_index()],
+    "workspaces": [_keyset("owner_email"), _keyset("members.email"), _id_index()],
+    "notifications": [_keyset("user_email"), _id_index()],
+    "crypto_wallets": [_keyset("user_email"), _id_index()],
+    "crypto_transactions": [_keyset("user_email"), _id_index()],
+    "chat_messages": [
+        # conversation_key is the sorted sender/receiver pair (see migrations.py)
+        _keyset("conversation_key"),
+        # replay of missed messages for the push channel
+        _keyset("receiver_email", direction=ASCENDING),
+        _id_index(),
+    ],
+    # presence is flushed with upserts keyed on user_email
+    "user_presence": [IndexModel([("user_email", ASCENDING)], name="user_email_unique", unique=True)],
+    # $inc upserts keyed on user_email
+    "unread_counters": [IndexModel([("user_email", ASCENDING)], name="user_email_unique", unique=True)],
+    "support_tickets": [_keyset("user_email"), _keyset(), _id_index()],
+    "support_interactions": [_keyset("user_email"), _keyset()],
+    "collaboration_sessions": [
+        _keyset("owner_email", sort_field="last_active"),
+        _keyset("participants.email", sort_field="last_active"),
+        _keyset(sort_field="last_active"),
+        _id_index(),
+    ],
+    # one rollup per (user_id, day); also the $merge key for rebuilds
+    "call_rollups": [
+        IndexModel([("user_id", ASCENDING), ("day", ASCENDING)], name="user_id_day_unique", unique=True),
+    ],
+    "projects": [_keyset("ownerId", sort_field="createdAt"), _id_index(), _payload_ref_index()],
+    "messages_archive": [_keyset("conversationId", sort_field="createdAt", direction=ASCENDING)],
+    # ARCHIVE_STORAGE=buckets: appends match (conversationId, day), reads walk
+    # a conversation's buckets by day then first message time
+    "messages_archive_buckets": [
+        IndexModel(
+            [("conversationId", ASCENDING), ("day", ASCENDING), ("first", ASCENDING), ("id", ASCENDING)],
+            name="conversationId_day_first_id",
+        ),
+    ],
+    "creator_assets": [
+        _keyset("ownerId", "type", sort_field="createdAt"),
+        _keyset("ownerId", sort_field="createdAt"),
+        _id_index(),
+        _payload_ref_index(),
+    ],
+}
+
+
+async def ensure_indexes(db) -> dict:
+    """Create every registered index. Failures (e.g. duplicate data blocking a
+    unique index) are logged per collection so one bad collection doesn't
+    block startup."""
+    created = {}
+    for name, models in INDEX_REGISTRY.items():
+        try:
+            created[name] = await db[name].create_indexes(models)
+        except OperationFailure as e:
+            logger.error("Index build failed on %s: %s", name, e)
+            created[name] = {"error": str(e)}
+    return created
+
+
+async def index_report(db) -> dict:
+    """Compare declared indexes against what exists, with usage stats."""
+    report = {}
+    for name, models in INDEX_REGISTRY.items():
+        declared = {m.document["name"] for m in models}
+        existing = set()
+        async for ix in db[name].list_indexes():
+            if ix["name"] != "_id_":
+                existing.add(ix["name"])
+
+        usage = {}
+        try:
+            async for stat in db[name].aggregate([{"$indexStats": {}}]):
+                usage[stat["name"]] = stat["accesses"]["ops"]
+        except OperationFailure:
+            pass
+
+        report[name] = {
+            "missing": sorted(declared - existing),
+            "undeclared": sorted(existing - declared),
+            "unused": sorted(n for n in existing if usage.get(n) == 0),
+            "ops": {n: usage[n] for n in sorted(existing) if n in usage},
+        }
+    return report
+
+
+async def _main(command: str):
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv()
+    client = AsyncIOMotorClient(os.environ.get("MONGO_URL"))
+    db = client[os.environ.get("DB_NAME", "emerald_orbit")]
+    if command == "ensure":
+        result = await ensure_indexes(db)
+    else:
+        result = await index_report(db)
+    print(json.dumps(result, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "report"
+    if command not in ("report", "ensure"):
+        print("usage: python indexes.py [report|ensure]")
+        sys.exit(2)
+    asyncio.run(_main(command))
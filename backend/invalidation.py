@@ -0,0 +1,200 @@
+"""Cross-worker invalidation for the in-process caches.
+
+Components register a handler per collection with ``InvalidationBus.subscribe``.
+Writes made by this worker are dispatched immediately through
+``InvalidationBus.publish``; the transport delivers everyone else's:
+
+* ``ChangeStreamTransport`` tails one MongoDB change stream over the watched
+  collections, so every worker sees every write, including ones made outside
+  the API. It needs a replica set or sharded cluster.
+* ``LocalTransport`` is the fallback for a standalone mongod: only this
+  worker's own publishes are seen, and other workers rely on cache TTLs.
+
+If the stream drops and its resume point is gone, events may have been
+missed, so every subscriber's reset handler runs (e.g. clear the cache).
+
+Subscribers can limit a collection to some operation types (e.g. only
+inserts, for live push); the stream then filters the rest out server-side.
+"""
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Callable, Optional
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+# The resume token is older than the oplog window
+_HISTORY_LOST = (136, 280, 286)
+_RETRY_SECONDS = 1.0
+
+
+class LocalTransport:
+    name = "local"
+
+    async def start(self, bus: "InvalidationBus"):
+        pass
+
+    async def stop(self):
+        pass
+
+    def stats(self) -> dict:
+        return {}
+
+
+class ChangeStreamTransport:
+    name = "change_stream"
+
+    def __init__(self, db, collections, operations: Optional[dict] = None):
+        self.db = db
+        self.collections = list(collections)
+        # collection -> operation types to watch; absent means all
+        self.operations = operations or {}
+        self._resume_token = None
+        self._task: Optional[asyncio.Task] = None
+        self.connected = False
+        self.reconnects = 0
+
+    def _pipeline(self) -> list:
+        unrestricted = [c for c in self.collections if c not in self.operations]
+        match = [{"ns.coll": {"$in": unrestricted}}] + [
+            {"ns.coll": coll, "operationType": {"$in": ops}} for coll, ops in self.operations.items()
+        ]
+        return [
+            # ahead of the post-image lookup, so filtered-out events cost nothing
+            {"$match": {"$or": match}},
+            # nothing downstream needs credentials
+            {"$project": {"fullDocument.hashed_password": 0}},
+        ]
+
+    async def start(self, bus: "InvalidationBus"):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(bus))
+
+    async def _run(self, bus: "InvalidationBus"):
+        while True:
+            try:
+                async with self.db.watch(
+                    self._pipeline(), full_document="updateLookup", resume_after=self._resume_token
+                ) as stream:
+                    if not self.connected and self.reconnects:
+                        logger.info("Invalidation change stream resumed")
+                    self.connected = True
+                    async for change in stream:
+                        self._resume_token = stream.resume_token
+                        bus.dispatch(
+                            change["ns"]["coll"],
+                            change["operationType"],
+                            change.get("fullDocument") or change.get("fullDocumentBeforeChange"),
+                        )
+            except asyncio.CancelledError:
+                raise
+            except OperationFailure as e:
+                if e.code in _HISTORY_LOST:
+                    logger.warning("Invalidation change stream lost its resume point: %s", e)
+                    self._resume_token = None
+                    bus.reset()
+                else:
+                    logger.warning("Invalidation change stream failed: %s", e)
+            except PyMongoError as e:
+                logger.warning("Invalidation change stream disconnected: %s", e)
+            self.connected = False
+            self.reconnects += 1
+            await asyncio.sleep(_RETRY_SECONDS)
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.connected = False
+
+    def stats(self) -> dict:
+        return {"connected": self.connected, "reconnects": self.reconnects}
+
+
+async def supports_change_streams(db) -> bool:
+    try:
+        hello = await db.command("hello")
+    except (PyMongoError, NotImplementedError) as e:
+        # NotImplementedError: stand-ins without commands (e.g. mongomock)
+        logger.warning("Deployment probe failed, assuming no change streams or transactions: %s", e)
+        return False
+    return bool(hello.get("setName")) or hello.get("msg") == "isdbgrid"
+
+
+class InvalidationBus:
+    def __init__(self, transport=None):
+        self.transport = transport or LocalTransport()
+        self._handlers: dict = defaultdict(list)
+        self._operations: dict = {}
+        self._resets: list = []
+        self.published = 0
+        self.dispatched = 0
+        self.resets = 0
+
+    @property
+    def collections(self) -> list:
+        return sorted(self._handlers)
+
+    @property
+    def operations(self) -> dict:
+        """Collections whose subscribers all limited the operation types."""
+        return {c: sorted(ops) for c, ops in self._operations.items() if ops is not None}
+
+    def subscribe(self, collection: str, on_change: Callable[[str, Optional[dict]], None],
+                  on_reset: Optional[Callable[[], None]] = None, operations: Optional[tuple] = None):
+        """on_change(operation, document) runs for every write to the
+        collection; document is None when the change carries no document
+        (e.g. a delete), and handlers should then drop everything they hold.
+        With operations set, the change stream only delivers those types
+        (handlers still see every local publish)."""
+        first = collection not in self._handlers
+        self._handlers[collection].append(on_change)
+        if operations is None or (not first and self._operations.get(collection) is None):
+            self._operations[collection] = None
+        else:
+            self._operations[collection] = self._operations.get(collection, set()) | set(operations)
+        if on_reset is not None:
+            self._resets.append(on_reset)
+
+    def publish(self, collection: str, operation: str, document: Optional[dict]):
+        """Apply a write made by this worker right away."""
+        self.published += 1
+        self.dispatch(collection, operation, document)
+
+    def dispatch(self, collection: str, operation: str, document: Optional[dict]):
+        for handler in self._handlers.get(collection, ()):
+            try:
+                handler(operation, document)
+            except Exception:
+                logger.exception("Invalidation handler failed for %s", collection)
+        self.dispatched += 1
+
+    def reset(self):
+        self.resets += 1
+        for on_reset in self._resets:
+            try:
+                on_reset()
+            except Exception:
+                logger.exception("Invalidation reset handler failed")
+
+    async def start(self):
+        await self.transport.start(self)
+
+    async def stop(self):
+        await self.transport.stop()
+
+    def stats(self) -> dict:
+        return {
+            "transport": self.transport.name,
+            "collections": self.collections,
+            "published": self.published,
+            "dispatched": self.dispatched,
+            "resets": self.resets,
+            **self.transport.stats(),
+        }
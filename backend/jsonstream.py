@@ -0,0 +1,162 @@
+"""Incremental validation of JSON bodies too large to parse in one go.
+
+``JSONObjectValidator.feed`` takes a body chunk by chunk and raises
+``InvalidJSON`` once the bytes seen so far can't begin a JSON object;
+``close`` checks that the object was completed. Only a number or literal
+split across a chunk boundary is carried over, so memory stays flat however
+large the body is. Strings, which are the bulk of large payloads, are
+scanned with a regex and never buffered, and runs of flat members such as
+``"x": 1.5, "name": "a",`` are matched in a single regex call, so the
+Python-level loop only runs for brackets and token boundaries.
+
+Numbers are also checked to fit a double, and ``\\u`` escapes to form
+whole characters (no unpaired surrogates), as orjson requires.
+"""
+import codecs
+import math
+import re
+
+_WHITESPACE = re.compile(rb"[ \t\n\r]*")
+# a \u escape outside the surrogate range, or a high surrogate followed by
+# a low one
+_HEX = rb"[0-9a-fA-F]"
+_ESCAPE = (rb'\\(?:["\\/bfnrt]|u(?:[0-9a-cA-CefEF]' + _HEX + rb"{3}|[dD][0-7]" + _HEX + rb"{2}"
+           rb"|[dD][89abAB]" + _HEX + rb"{2}\\u[dD][c-fC-F]" + _HEX + rb"{2}))")
+_CHARS = rb'[^"\\\x00-\x1f]*'
+# string contents up to the closing quote, a backslash that starts an
+# incomplete escape, or an invalid character
+_STRING_BODY = re.compile(_CHARS + rb"(?:" + _ESCAPE + _CHARS + rb")*")
+_PARTIAL_ESCAPE = re.compile(
+    rb"\\(?:u(?:" + _HEX + rb"{0,3}|[dD][89abAB]" + _HEX + rb"{2}(?:\\(?:u(?:[dD](?:[c-fC-F]" + _HEX + rb"?)?)?)?)?))?"
+)
+_BARE = re.compile(rb'[^ \t\n\r{}\[\]:,"]*')
+_NUMBER = re.compile(rb"-?(?:0|[1-9][0-9]*)(?:\.[0-9]+)?(?:[eE][+-]?[0-9]+)?")
+# complete members ending in a comma; numbers with an exponent are left to
+# the token path, which checks them for overflow
+_WS = rb"[ \t\n\r]*"
+_STRING = rb'"' + _STRING_BODY.pattern + rb'"'
+_SCALAR = rb"(?:" + _STRING + rb"|-?(?:0|[1-9][0-9]*)(?:\.[0-9]+)?(?![0-9.eE])|true|false|null)"
+_OBJECT_RUN = re.compile(rb"(?:" + _WS + _STRING + _WS + rb":" + _WS + _SCALAR + _WS + rb",)*")
+_ARRAY_RUN = re.compile(rb"(?:" + _WS + _SCALAR + _WS + rb",)*")
+_LITERALS = (b"true", b"false", b"null")
+# longest number or literal worth waiting on across a chunk boundary
+_MAX_BARE = 64
+
+_VALUE, _KEY_OR_END, _KEY, _COLON, _VALUE_OR_END, _COMMA_OR_END, _DONE = range(7)
+
+
+class InvalidJSON(ValueError):
+    pass
+
+
+class JSONObjectValidator:
+    def __init__(self):
+        self._state = _VALUE
+        self._stack: list = []
+        self._pending = b""
+        self._in_string = False
+        self._string_is_key = False
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+
+    def feed(self, chunk: bytes):
+        try:
+            self._utf8.decode(chunk)
+        except UnicodeDecodeError:
+            raise InvalidJSON("body is not valid UTF-8")
+        self._pending = self._scan(self._pending + chunk if self._pending else chunk)
+
+    def close(self):
+        try:
+            self._utf8.decode(b"", final=True)
+        except UnicodeDecodeError:
+            raise InvalidJSON("body is not valid UTF-8")
+        if self._pending or self._in_string or self._state != _DONE:
+            raise InvalidJSON("body ends before the JSON object is complete")
+
+    def _value_done(self):
+        self._state = _COMMA_OR_END if self._stack else _DONE
+
+    def _unexpected(self, buf: bytes, pos: int) -> InvalidJSON:
+        return InvalidJSON(f"unexpected {buf[pos:pos + 1]!r}")
+
+    def _scan(self, buf: bytes) -> bytes:
+        """Consume buf and return the bytes to carry over to the next chunk."""
+        pos, end = 0, len(buf)
+        while pos < end:
+            if self._in_string:
+                pos = _STRING_BODY.match(buf, pos).end()
+                if pos == end:
+                    return b""
+                if buf[pos] == 0x22:
+                    pos += 1
+                    self._in_string = False
+                    if self._string_is_key:
+                        self._state = _COLON
+                    else:
+                        self._value_done()
+                    continue
+                if _PARTIAL_ESCAPE.fullmatch(buf, pos):
+                    return buf[pos:]
+                raise InvalidJSON("invalid character or escape in string")
+
+            if self._state in (_KEY_OR_END, _KEY):
+                run_end = _OBJECT_RUN.match(buf, pos).end()
+                if run_end > pos:
+                    pos, self._state = run_end, _KEY
+            elif self._state in (_VALUE, _VALUE_OR_END) and self._stack and self._stack[-1] == b"[":
+                run_end = _ARRAY_RUN.match(buf, pos).end()
+                if run_end > pos:
+                    pos, self._state = run_end, _VALUE
+            pos = _WHITESPACE.match(buf, pos).end()
+            if pos == end:
+                break
+            state, char = self._state, buf[pos:pos + 1]
+            if state == _DONE:
+                raise InvalidJSON("unexpected data after the JSON object")
+            if not self._stack and char != b"{":
+                raise InvalidJSON("body must be a JSON object")
+
+            if char == b'"':
+                if state in (_KEY_OR_END, _KEY):
+                    self._string_is_key = True
+                elif state in (_VALUE, _VALUE_OR_END):
+                    self._string_is_key = False
+                else:
+                    raise self._unexpected(buf, pos)
+                self._in_string = True
+            elif char in (b"{", b"["):
+                if state not in (_VALUE, _VALUE_OR_END):
+                    raise self._unexpected(buf, pos)
+                self._stack.append(char)
+                self._state = _KEY_OR_END if char == b"{" else _VALUE_OR_END
+            elif char in (b"}", b"]"):
+                opener, empty = (b"{", _KEY_OR_END) if char == b"}" else (b"[", _VALUE_OR_END)
+                if self._stack[-1] != opener or state not in (_COMMA_OR_END, empty):
+                    raise self._unexpected(buf, pos)
+                self._stack.pop()
+                self._value_done()
+            elif char == b":":
+                if state != _COLON:
+                    raise self._unexpected(buf, pos)
+                self._state = _VALUE
+            elif char == b",":
+                if state != _COMMA_OR_END:
+                    raise self._unexpected(buf, pos)
+                self._state = _KEY if self._stack[-1] == b"{" else _VALUE
+            else:
+                if state not in (_VALUE, _VALUE_OR_END):
+                    raise self._unexpected(buf, pos)
+                token_end = _BARE.match(buf, pos).end()
+                if token_end == end:
+                    # may continue in the next chunk
+                    if end - pos > _MAX_BARE:
+                        raise InvalidJSON("invalid number or literal")
+                    return buf[pos:]
+                token = buf[pos:token_end]
+                if token not in _LITERALS and not (_NUMBER.fullmatch(token) and math.isfinite(float(token))):
+                    raise InvalidJSON(f"invalid number or literal {token[:20]!r}")
+                self._value_done()
+                pos = token_end
+                continue
+            pos += 1
+        return b""
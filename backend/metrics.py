@@ -0,0 +1,213 @@
+"""Minimal Prometheus-style instrumentation.
+
+Request metrics come from ``MetricsMiddleware`` (a plain ASGI middleware, so
+streaming responses pass straight through) and Mongo timings from
+``MongoCommandMetrics``, a pymongo command listener registered on the Motor
+client. pymongo calls listeners from Motor's executor threads, so metric
+updates take a lock.
+"""
+import threading
+import time
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+from pymongo import monitoring
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple, float] = {}
+
+    def _key(self, labels: dict) -> Tuple:
+        return tuple(labels.get(n, "") for n in self.labelnames)
+
+    def header(self) -> list:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self) -> list:
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [f"{self.name}{_labels(self.labelnames, k)} {_number(v)}" for k, v in items]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class GaugeFunc(_Metric):
+    """Gauge sampled at scrape time, e.g. from a component's stats()."""
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, fn: Callable[[], float]):
+        super().__init__(name, help)
+        self.fn = fn
+
+    def render(self) -> list:
+        return self.header() + [f"{self.name} {_number(self.fn())}"]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # per-bucket counts, then sum and count
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> list:
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._series.items()]
+        lines = self.header()
+        for key, series in items:
+            cumulative = 0
+            for i, bound in enumerate(self.buckets):
+                cumulative += series[i]
+                le = _labels(self.labelnames, key, 'le="%s"' % bound)
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            le = _labels(self.labelnames, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{le} {series[-1]}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(series[-2])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {series[-1]}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    def __init__(self, app, requests: Counter, latency: Histogram, in_flight: Gauge):
+        self.app = app
+        self.requests = requests
+        self.latency = latency
+        self.in_flight = in_flight
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        method = scope["method"]
+        start = time.perf_counter()
+        self.in_flight.inc(method=method)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self.in_flight.dec(method=method)
+            # FastAPI stores the matched route in the scope during routing
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            labels = {"method": method, "route": path, "status": str(status)}
+            self.requests.inc(**labels)
+            self.latency.observe(time.perf_counter() - start, **labels)
+
+
+_SKIPPED_COMMANDS = {"hello", "ismaster", "isMaster", "saslStart", "saslContinue", "endSessions"}
+
+
+def _collection_of(event) -> Optional[str]:
+    if event.command_name == "getMore":
+        return event.command.get("collection")
+    target = event.command.get(event.command_name)
+    return target if isinstance(target, str) else None
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    def __init__(self, latency: Histogram, errors: Counter):
+        self.latency = latency
+        self.errors = errors
+        self._pending: Dict[Tuple, str] = {}
+
+    def started(self, event):
+        if event.command_name in _SKIPPED_COMMANDS:
+            return
+        self._pending[(event.connection_id, event.request_id)] = _collection_of(event) or event.database_name
+
+    def _finish(self, event) -> Optional[str]:
+        return self._pending.pop((event.connection_id, event.request_id), None)
+
+    def succeeded(self, event):
+        collection = self._finish(event)
+        if collection is not None:
+            self.latency.observe(event.duration_micros / 1e6, collection=collection, command=event.command_name)
+
+    def failed(self, event):
+        collection = self._finish(event)
+        if collection is not None:
+            self.latency.observe(event.duration_micros / 1e6, collection=collection, command=event.command_name)
+            self.errors.inc(collection=collection, command=event.command_name)
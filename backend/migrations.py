@@ -0,0 +1,199 @@
+"""One-off data migrations, run by hand before deploying the code that needs them.
+
+Migrations are idempotent and can be interrupted and re-run; backfills work
+in batches of ``_id`` and skip documents that are already migrated.
+
+    python migrations.py list
+    python migrations.py conversation_keys
+    python migrations.py unread_counters
+    python migrations.py archive_buckets
+    python migrations.py call_rollups
+"""
+import asyncio
+import json
+import logging
+import os
+import sys
+import uuid
+
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = int(os.environ.get("MIGRATION_BATCH_SIZE", "5000"))
+ARCHIVE_BUCKET_SIZE = int(os.environ.get("ARCHIVE_BUCKET_SIZE", "200"))
+
+
+def conversation_key(email_a: str, email_b: str) -> str:
+    """Canonical key for a pair of participants, independent of direction."""
+    return "|".join(sorted((email_a, email_b)))
+
+
+def rollup_status(status: str) -> str:
+    """call_rollups key for a call status; statuses become field names under "statuses"."""
+    return status.replace(".", "_").lstrip("$") or "unknown"
+
+
+def _rollup_status_expr(field: str) -> dict:
+    # rollup_status as an aggregation expression; "$" must be $literal or it
+    # reads as a field path
+    cleaned = {"$ltrim": {
+        "input": {"$replaceAll": {"input": {"$toString": field}, "find": ".", "replacement": "_"}},
+        "chars": {"$literal": "$"},
+    }}
+    return {"$let": {"vars": {"s": cleaned}, "in": {"$cond": [{"$eq": ["$$s", ""]}, "unknown", "$$s"]}}}
+
+
+async def _batched_update(collection, query: dict, update, batch_size: int = BATCH_SIZE) -> int:
+    updated = 0
+    while True:
+        ids = [d["_id"] async for d in collection.find(query, {"_id": 1}).limit(batch_size)]
+        if not ids:
+            return updated
+        result = await collection.update_many({"_id": {"$in": ids}, **query}, update)
+        updated += result.modified_count
+        logger.info("%s: %d documents updated", collection.name, updated)
+
+
+async def backfill_conversation_keys(db) -> dict:
+    """Set chat_messages.conversation_key server-side; Mongo's binary string
+    comparison orders the pair the same way as ``conversation_key``."""
+    sender, receiver = "$sender_email", "$receiver_email"
+    update = [{"$set": {"conversation_key": {"$cond": [
+        {"$lte": [sender, receiver]},
+        {"$concat": [sender, "|", receiver]},
+        {"$concat": [receiver, "|", sender]},
+    ]}}}]
+    updated = await _batched_update(db.chat_messages, {"conversation_key": {"$exists": False}}, update)
+    return {"chat_messages": updated}
+
+
+async def rebuild_unread_counters(db) -> dict:
+    """Recompute unread_counters from notifications and chat_messages. Also
+    the repair path if the $inc-maintained counters drift."""
+    sources = {
+        "notifications": (db.notifications, "$user_email"),
+        "messages": (db.chat_messages, "$receiver_email"),
+    }
+    counts: dict = {}
+    for field, (collection, owner) in sources.items():
+        pipeline = [{"$match": {"read": False}}, {"$group": {"_id": owner, "count": {"$sum": 1}}}]
+        async for row in collection.aggregate(pipeline, allowDiskUse=True):
+            if row["_id"]:
+                counts.setdefault(row["_id"], {"notifications": 0, "messages": 0})[field] = row["count"]
+
+    # users with counters but nothing unread any more
+    async for doc in db.unread_counters.find({}, {"_id": 0, "user_email": 1}):
+        counts.setdefault(doc["user_email"], {"notifications": 0, "messages": 0})
+    ops = [UpdateOne({"user_email": email}, {"$set": fields}, upsert=True) for email, fields in counts.items()]
+    for start in range(0, len(ops), BATCH_SIZE):
+        await db.unread_counters.bulk_write(ops[start:start + BATCH_SIZE], ordered=False)
+    return {"unread_counters": len(ops)}
+
+
+async def move_archive_to_buckets(db) -> dict:
+    """Pack per-message messages_archive documents into messages_archive_buckets
+    (the ARCHIVE_STORAGE=buckets layout), deleting each batch of source
+    documents once its buckets are written. A re-run after an interruption
+    only leaves a few partially filled buckets, which reads handle."""
+    source, target = db.messages_archive, db.messages_archive_buckets
+    moved = buckets = 0
+    while True:
+        docs = await source.find({}).sort(
+            [("conversationId", 1), ("createdAt", 1), ("id", 1)]
+        ).limit(BATCH_SIZE).to_list(BATCH_SIZE)
+        if not docs:
+            return {"messages": moved, "buckets": buckets}
+        packed, current = [], None
+        for doc in docs:
+            day = doc["createdAt"][:10]
+            if (current is None or current["conversationId"] != doc["conversationId"]
+                    or current["day"] != day or current["count"] >= ARCHIVE_BUCKET_SIZE):
+                current = {"id": str(uuid.uuid4()), "conversationId": doc["conversationId"], "day": day,
+                           "count": 0, "first": doc["createdAt"], "last": doc["createdAt"], "messages": []}
+                packed.append(current)
+            message = {k: v for k, v in doc.items() if k != "_id"}
+            current["messages"].append(message)
+            current["count"] += 1
+            current["last"] = doc["createdAt"]
+        await target.insert_many(packed, ordered=False)
+        await source.delete_many({"_id": {"$in": [d["_id"] for d in docs]}})
+        moved += len(docs)
+        buckets += len(packed)
+        logger.info("messages_archive: %d messages moved into %d buckets", moved, buckets)
+
+
+async def rebuild_call_rollups(db) -> dict:
+    """Recompute call_rollups from call_history server-side with $group and
+    $merge. Calls logged while this runs can be counted twice for the days
+    being rewritten, so run it when ingestion is quiet."""
+    started = {"$dateFromString": {"dateString": "$startedAt"}}
+    pipeline = [
+        {"$match": {"startedAt": {"$type": "string"}, "durationSeconds": {"$type": "number"}}},
+        {"$project": {
+            "day": {"$dateToString": {"format": "%Y-%m-%d", "date": started}},
+            "status": {"$ifNull": [_rollup_status_expr("$status"), "unknown"]},
+            "durationSeconds": 1,
+            "users": {"$setUnion": [
+                {"$filter": {"input": ["$callerId", "$calleeId"], "cond": {"$ne": ["$$this", None]}}},
+                ["*"],
+            ]},
+        }},
+        {"$unwind": "$users"},
+        {"$group": {
+            "_id": {"user_id": "$users", "day": "$day", "status": "$status"},
+            "calls": {"$sum": 1},
+            "duration_seconds": {"$sum": "$durationSeconds"},
+        }},
+        {"$group": {
+            "_id": {"user_id": "$_id.user_id", "day": "$_id.day"},
+            "calls": {"$sum": "$calls"},
+            "duration_seconds": {"$sum": "$duration_seconds"},
+            "statuses": {"$push": {"k": "$_id.status", "v": "$calls"}},
+        }},
+        {"$project": {
+            "_id": 0,
+            "user_id": "$_id.user_id",
+            "day": "$_id.day",
+            "calls": 1,
+            "duration_seconds": 1,
+            "statuses": {"$arrayToObject": "$statuses"},
+        }},
+        {"$merge": {"into": "call_rollups", "on": ["user_id", "day"], "whenMatched": "replace", "whenNotMatched": "insert"}},
+    ]
+    await db.call_history.aggregate(pipeline, allowDiskUse=True).to_list(None)
+    return {"call_rollups": await db.call_rollups.count_documents({})}
+
+
+MIGRATIONS = {
+    "conversation_keys": backfill_conversation_keys,
+    "unread_counters": rebuild_unread_counters,
+    "archive_buckets": move_archive_to_buckets,
+    "call_rollups": rebuild_call_rollups,
+}
+
+
+async def _main(names: list):
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    client = AsyncIOMotorClient(os.environ.get("MONGO_URL"))
+    db = client[os.environ.get("DB_NAME", "emerald_orbit")]
+    results = {}
+    for name in names:
+        results[name] = await MIGRATIONS[name](db)
+    print(json.dumps(results, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    names = sys.argv[1:]
+    if not names or names == ["list"]:
+        print("\n".join(MIGRATIONS))
+        sys.exit(0 if names else 2)
+    unknown = [n for n in names if n not in MIGRATIONS]
+    if unknown:
+        print(f"unknown migrations: {', '.join(unknown)}; available: {', '.join(MIGRATIONS)}")
+        sys.exit(2)
+    asyncio.run(_main(names))
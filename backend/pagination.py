@@ -0,0 +1,94 @@
+"""Keyset pagination over (sort_field, id).
+
+Cursors are opaque base64 tokens holding the sort value and id of the last
+document on the previous page, so every page is an index range scan no matter
+how deep the client pages.
+"""
+import base64
+import json
+from typing import List, Optional, Tuple
+
+from pymongo import ASCENDING, DESCENDING
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(values: list) -> str:
+    raw = json.dumps(values, separators=(",", ":"), default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> list:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(str(e))
+    if not isinstance(values, list) or len(values) != 2:
+        raise InvalidCursor("Malformed cursor")
+    return values
+
+
+def sort_spec(sort_field: str, direction: int = DESCENDING) -> list:
+    return [(sort_field, direction), ("id", direction)]
+
+
+def keyset_filter(sort_field: str, direction: int, cursor: str) -> dict:
+    value, last_id = decode_cursor(cursor)
+    op = "$lt" if direction == DESCENDING else "$gt"
+    return {"$or": [
+        {sort_field: {op: value}},
+        {sort_field: value, "id": {op: last_id}},
+    ]}
+
+
+def cursor_for(doc: dict, sort_field: str) -> str:
+    return encode_cursor([doc.get(sort_field), doc.get("id")])
+
+
+async def fetch_page(
+    collection,
+    query: dict,
+    projection: Optional[dict] = None,
+    *,
+    sort_field: str = "created_date",
+    direction: int = DESCENDING,
+    cursor: Optional[str] = None,
+    limit: int = 100,
+) -> Tuple[List[dict], Optional[str]]:
+    """Return one page of documents and the cursor for the next page (or None)."""
+    if cursor:
+        bound = keyset_filter(sort_field, direction, cursor)
+        query = {"$and": [query, bound]} if query else bound
+
+    docs = await collection.find(query, projection).sort(sort_spec(sort_field, direction)).limit(limit + 1).to_list(limit + 1)
+    if len(docs) <= limit:
+        return docs, None
+    docs = docs[:limit]
+    return docs, cursor_for(docs[-1], sort_field)
+
+
+
+def page_list(
+    items: List[dict],
+    *,
+    sort_field: str,
+    direction: int = ASCENDING,
+    cursor: Optional[str] = None,
+    limit: int = 100,
+) -> Tuple[List[dict], Optional[str]]:
+    """Same keyset contract as fetch_page, for data already held in memory."""
+    reverse = direction == DESCENDING
+    items = sorted(items, key=lambda d: (d.get(sort_field), d.get("id")), reverse=reverse)
+    if cursor:
+        bound = tuple(decode_cursor(cursor))
+        if reverse:
+            items = [d for d in items if (d.get(sort_field), d.get("id")) < bound]
+        else:
+            items = [d for d in items if (d.get(sort_field), d.get("id")) > bound]
+    if len(items) <= limit:
+        return items, None
+    items = items[:limit]
+    return items, cursor_for(items[-1], sort_field)
@@ -0,0 +1,65 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from passlib.context import CryptContext
+
+
+class PasswordEngineBusy(Exception):
+    def __init__(self, retry_after: int):
+        super().__init__("Password engine queue is full")
+        self.retry_after = retry_after
+
+
+class PasswordEngine:
+    """Runs bcrypt hashing/verification on a bounded thread pool.
+
+    bcrypt releases the GIL, so a small pool gives real parallelism while the
+    event loop keeps serving other routes. Work beyond ``max_workers`` waits in
+    the executor queue; once ``max_queue`` calls are waiting, new calls are
+    rejected with ``PasswordEngineBusy`` instead of piling up.
+    """
+
+    def __init__(self, context: CryptContext, max_workers: int = 4, max_queue: int = 64, retry_after: int = 1):
+        self.context = context
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="password-engine")
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+
+    @property
+    def queue_depth(self) -> int:
+        return max(0, self.pending - self.max_workers)
+
+    async def _run(self, fn, *args):
+        if self.pending >= self.max_workers + self.max_queue:
+            self.rejected += 1
+            raise PasswordEngineBusy(self.retry_after)
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, fn, *args)
+        finally:
+            self.pending -= 1
+            self.completed += 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self.context.hash, password)
+
+    async def verify(self, plain: str, hashed: str) -> bool:
+        return await self._run(self.context.verify, plain, hashed)
+
+    def stats(self) -> dict:
+        return {
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "in_flight": min(self.pending, self.max_workers),
+            "queue_depth": self.queue_depth,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
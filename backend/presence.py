@@ -0,0 +1,147 @@
+"""Write-behind presence table.
+
+Heartbeats only touch an in-memory dict; a background task flushes dirty
+entries to ``user_presence`` with one unordered ``bulk_write`` of upserts per
+interval, marks users offline once their heartbeats stop, and periodically
+merges entries written by other workers back in.
+"""
+import asyncio
+import logging
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
+
+logger = logging.getLogger(__name__)
+
+
+def _epoch(iso: Optional[str]) -> float:
+    try:
+        return datetime.fromisoformat(iso).timestamp()
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class PresenceStore:
+    def __init__(self, collection, flush_interval: float = 2.0, offline_after: float = 90.0, refresh_every: int = 15):
+        self.collection = collection
+        self.flush_interval = flush_interval
+        self.offline_after = offline_after
+        self.refresh_every = refresh_every
+        self.entries: dict = {}
+        self._beats: dict = {}
+        self._dirty: set = set()
+        self._task: Optional[asyncio.Task] = None
+        self.heartbeats = 0
+        self.flushed = 0
+
+    def heartbeat(self, user_email: str, user_name: str, status: str = "online") -> dict:
+        entry = self.entries.get(user_email)
+        if entry is None:
+            entry = {"id": str(uuid.uuid4()), "user_email": user_email}
+            self.entries[user_email] = entry
+        now = time.time()
+        entry["user_name"] = user_name
+        entry["status"] = status
+        entry["last_seen"] = datetime.fromtimestamp(now, timezone.utc).isoformat()
+        self._beats[user_email] = now
+        self._dirty.add(user_email)
+        self.heartbeats += 1
+        return entry
+
+    def snapshot(self) -> List[dict]:
+        return [dict(self.entries[email]) for email in sorted(self.entries)]
+
+    def expire(self) -> int:
+        cutoff = time.time() - self.offline_after
+        expired = 0
+        for email, entry in self.entries.items():
+            if entry.get("status") != "offline" and self._beats.get(email, 0.0) < cutoff:
+                entry["status"] = "offline"
+                self._dirty.add(email)
+                expired += 1
+        return expired
+
+    def apply(self, doc: dict) -> bool:
+        """Merge one persisted entry (e.g. flushed by another worker); local
+        unflushed writes and newer heartbeats win."""
+        email = doc.get("user_email")
+        if not email or email in self._dirty:
+            return False
+        seen = _epoch(doc.get("last_seen"))
+        if seen < self._beats.get(email, 0.0):
+            return False
+        doc = {k: v for k, v in doc.items() if k != "_id"}
+        doc.setdefault("id", str(uuid.uuid4()))
+        self.entries[email] = doc
+        self._beats[email] = seen
+        return True
+
+    async def load(self):
+        """Merge persisted presence into memory; local unflushed writes win."""
+        async for doc in self.collection.find({}, {"_id": 0}):
+            self.apply(doc)
+
+    async def flush(self) -> int:
+        if not self._dirty:
+            return 0
+        dirty, self._dirty = self._dirty, set()
+        ops = []
+        for email in dirty:
+            entry = self.entries.get(email)
+            if entry is None:
+                continue
+            fields = {k: v for k, v in entry.items() if k != "id"}
+            ops.append(UpdateOne(
+                {"user_email": email},
+                {"$set": fields, "$setOnInsert": {"id": entry["id"]}},
+                upsert=True,
+            ))
+        if not ops:
+            return 0
+        try:
+            await self.collection.bulk_write(ops, ordered=False)
+        except PyMongoError as e:
+            logger.warning("Presence flush failed, retrying next cycle: %s", e)
+            self._dirty |= dirty
+            return 0
+        self.flushed += len(ops)
+        return len(ops)
+
+    async def _run(self):
+        cycle = 0
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            cycle += 1
+            self.expire()
+            await self.flush()
+            if self.refresh_every and cycle % self.refresh_every == 0:
+                try:
+                    await self.load()
+                except PyMongoError as e:
+                    logger.warning("Presence refresh failed: %s", e)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "users": len(self.entries),
+            "dirty": len(self._dirty),
+            "heartbeats": self.heartbeats,
+            "flushed": self.flushed,
+        }
@@ -0,0 +1,209 @@
+"""Slow-query log and explain-plan auditor.
+
+``SlowQueryLog`` is a pymongo command listener that keeps the slowest recent
+operations (anything over ``threshold_ms``) with their filter/sort *shape*,
+and samples a fraction of reads so their plans can be checked later.
+``audit`` runs ``explain`` on the sampled queries plus the known route shapes
+in ``ROUTE_QUERIES`` and flags collection scans and in-memory sorts.
+
+    python profiling.py            # audit the known route query shapes
+"""
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+
+from pymongo import monitoring
+from pymongo.errors import OperationFailure
+
+_READ_COMMANDS = {"find", "aggregate", "count", "distinct"}
+_WRITE_COMMANDS = {"update", "delete", "findAndModify"}
+_SKIPPED_COMMANDS = {"hello", "ismaster", "isMaster", "saslStart", "saslContinue", "endSessions", "explain"}
+
+
+def query_shape(value):
+    """Replace literal values with their type so equal-shaped queries group."""
+    if isinstance(value, dict):
+        return {k: query_shape(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [query_shape(v) for v in value[:3]]
+    return type(value).__name__
+
+
+def _operation(command_name: str, command: dict) -> dict:
+    if command_name == "find":
+        return {"filter": command.get("filter", {}), "sort": command.get("sort")}
+    if command_name == "aggregate":
+        return {"pipeline": command.get("pipeline", [])}
+    if command_name in ("count", "distinct"):
+        return {"filter": command.get("query", {})}
+    if command_name == "findAndModify":
+        return {"filter": command.get("query", {}), "sort": command.get("sort")}
+    if command_name in ("update", "delete"):
+        key = "updates" if command_name == "update" else "deletes"
+        statements = command.get(key) or [{}]
+        return {"filter": statements[0].get("q", {})}
+    return {}
+
+
+class SlowQueryLog(monitoring.CommandListener):
+    def __init__(self, threshold_ms: float = 100.0, sample_rate: float = 0.0, max_entries: int = 200):
+        self.threshold_ms = threshold_ms
+        self.sample_rate = sample_rate
+        self.entries: deque = deque(maxlen=max_entries)
+        self.samples: dict = {}
+        self.max_samples = max_entries
+        self._pending: dict = {}
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        name = event.command_name
+        if name in _SKIPPED_COMMANDS or name not in _READ_COMMANDS | _WRITE_COMMANDS:
+            return
+        collection = event.command.get(name)
+        if not isinstance(collection, str):
+            return
+        self._pending[(event.connection_id, event.request_id)] = (
+            event.database_name, collection, name, _operation(name, event.command)
+        )
+
+    def succeeded(self, event):
+        self._record(event, failed=False)
+
+    def failed(self, event):
+        self._record(event, failed=True)
+
+    def _record(self, event, failed: bool):
+        pending = self._pending.pop((event.connection_id, event.request_id), None)
+        if pending is None:
+            return
+        database, collection, name, operation = pending
+        duration_ms = event.duration_micros / 1000.0
+        shape = query_shape(operation)
+        key = json.dumps([collection, name, shape], sort_keys=True, default=str)
+
+        with self._lock:
+            if duration_ms >= self.threshold_ms:
+                self.entries.append({
+                    "at": time.time(),
+                    "collection": collection,
+                    "command": name,
+                    "duration_ms": round(duration_ms, 3),
+                    "shape": shape,
+                    "failed": failed,
+                })
+            # Keep one concrete example per shape for explain()
+            if name in _READ_COMMANDS and self.sample_rate and key not in self.samples:
+                if len(self.samples) < self.max_samples and random.random() < self.sample_rate:
+                    self.samples[key] = {"database": database, "collection": collection, "command": name, "operation": operation}
+
+    def slow_queries(self, limit: int = 100) -> list:
+        with self._lock:
+            entries = list(self.entries)
+        return sorted(entries, key=lambda e: e["duration_ms"], reverse=True)[:limit]
+
+    def sampled(self) -> list:
+        with self._lock:
+            return list(self.samples.values())
+
+
+# Representative query shapes for the hot routes in server.py. The CLI audits
+# these without needing live traffic.
+ROUTE_QUERIES = [
+    {"route": "get_contacts", "collection": "contacts", "command": "find",
+     "operation": {"filter": {"user_email": "x"}, "sort": {"created_date": -1, "id": -1}}},
+    {"route": "get_calls", "collection": "call_history", "command": "find",
+     "operation": {"filter": {"user_email": "x"}, "sort": {"created_date": -1, "id": -1}}},
+    {"route": "get_call_history", "collection": "call_history", "command": "find",
+     "operation": {"filter": {"$or": [{"callerId": "x"}, {"calleeId": "x"}]}, "sort": {"createdAt": -1, "id": -1}}},
+    {"route": "get_properties", "collection": "properties", "command": "find",
+     "operation": {"filter": {"status": "for_sale"}, "sort": {"created_date": -1, "id": -1}}},
+    {"route": "properties_within", "collection": "properties", "command": "find",
+     "operation": {"filter": {"location": {"$geoWithin": {"$geometry": {
+         "type": "Polygon", "coordinates": [[[0, 0], [1, 0], [1, 1], [0, 1], [0, 0]]]}}}, "status": "for_sale"}}},
+    {"route": "get_notifications", "collection": "notifications", "command": "find",
+     "operation": {"filter": {"user_email": "x"}, "sort": {"created_date": -1, "id": -1}}},
+    {"route": "get_messages", "collection": "chat_messages", "command": "find",
+     "operation": {"filter": {"conversation_key": "a|b"}, "sort": {"created_date": -1, "id": -1}}},
+    {"route": "get_workspaces", "collection": "workspaces", "command": "find",
+     "operation": {"filter": {"$or": [{"owner_email": "x"}, {"members.email": "x"}]},
+                   "sort": {"created_date": -1, "id": -1}}},
+    {"route": "get_sessions", "collection": "collaboration_sessions", "command": "find",
+     "operation": {"filter": {"$or": [{"owner_email": "x"}, {"participants.email": "x"}]},
+                   "sort": {"last_active": -1, "id": -1}}},
+    {"route": "get_archived_messages", "collection": "messages_archive", "command": "find",
+     "operation": {"filter": {"conversationId": "x"}, "sort": {"createdAt": 1, "id": 1}}},
+    {"route": "get_projects", "collection": "projects", "command": "find",
+     "operation": {"filter": {"ownerId": "x"}, "sort": {"createdAt": -1, "id": -1}}},
+    {"route": "get_creator_assets", "collection": "creator_assets", "command": "find",
+     "operation": {"filter": {"ownerId": "x", "type": "scene"}, "sort": {"createdAt": -1, "id": -1}}},
+    {"route": "login", "collection": "users", "command": "find", "operation": {"filter": {"email": "x"}}},
+]
+
+
+def _walk_stages(plan, found: set):
+    if isinstance(plan, dict):
+        stage = plan.get("stage")
+        if stage:
+            found.add(stage)
+        for key, value in plan.items():
+            if key != "rejectedPlans":
+                _walk_stages(value, found)
+    elif isinstance(plan, list):
+        for item in plan:
+            _walk_stages(item, found)
+
+
+async def explain_query(db, collection: str, command: str, operation: dict) -> dict:
+    if command == "find":
+        cmd = {"find": collection, "filter": operation.get("filter") or {}}
+        if operation.get("sort"):
+            cmd["sort"] = operation["sort"]
+    elif command == "aggregate":
+        cmd = {"aggregate": collection, "pipeline": operation.get("pipeline", []), "cursor": {}}
+    elif command == "count":
+        cmd = {"count": collection, "query": operation.get("filter") or {}}
+    else:
+        cmd = {"distinct": collection, "key": "_id", "query": operation.get("filter") or {}}
+    plan = await db.command({"explain": cmd, "verbosity": "queryPlanner"})
+    stages: set = set()
+    _walk_stages(plan.get("queryPlanner", plan), stages)
+    issues = []
+    if "COLLSCAN" in stages:
+        issues.append("COLLSCAN")
+    if "SORT" in stages:
+        issues.append("IN_MEMORY_SORT")
+    return {"stages": sorted(stages), "issues": issues}
+
+
+async def audit(db, queries: list) -> list:
+    report = []
+    for query in queries:
+        entry = {k: v for k, v in query.items() if k not in ("operation", "database")}
+        entry["shape"] = query_shape(query["operation"])
+        try:
+            entry.update(await explain_query(db, query["collection"], query["command"], query["operation"]))
+        except OperationFailure as e:
+            entry["error"] = str(e)
+        report.append(entry)
+    return report
+
+
+async def _main():
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv()
+    client = AsyncIOMotorClient(os.environ.get("MONGO_URL"))
+    db = client[os.environ.get("DB_NAME", "emerald_orbit")]
+    report = await audit(db, ROUTE_QUERIES)
+    print(json.dumps(report, indent=2, default=str))
+    if any(entry.get("issues") for entry in report):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
@@ -0,0 +1,79 @@
+"""Per-user fan-out of new notifications and chat messages.
+
+Each connected client gets a bounded queue registered under its user email.
+Publishing never blocks the writer: a client too slow to drain its queue
+loses events and is expected to reconnect with ``Last-Event-ID`` to replay
+them from Mongo.
+
+Events reach the hub through the invalidation bus, so the writing worker
+sees its own insert twice: once from the local publish and again from the
+change stream. Recently published events are remembered and repeats dropped.
+"""
+import asyncio
+from collections import OrderedDict, defaultdict
+from contextlib import asynccontextmanager
+
+from responses import dumps
+
+
+class PushHub:
+    def __init__(self, queue_size: int = 256, recent_size: int = 4096):
+        self.queue_size = queue_size
+        self.recent_size = recent_size
+        self._subscribers: dict = defaultdict(set)
+        self._recent: OrderedDict = OrderedDict()
+        self.published = 0
+        self.dropped = 0
+        self.duplicates = 0
+
+    def _seen(self, key: tuple) -> bool:
+        if key in self._recent:
+            self.duplicates += 1
+            return True
+        self._recent[key] = None
+        if len(self._recent) > self.recent_size:
+            self._recent.popitem(last=False)
+        return False
+
+    def publish(self, user_email: str, event: str, event_id: str, data: dict) -> int:
+        queues = self._subscribers.get(user_email)
+        if not queues or self._seen((user_email, event, event_id, data.get("id"))):
+            return 0
+        message = {"id": event_id, "event": event, "data": data}
+        delivered = 0
+        for queue in queues:
+            try:
+                queue.put_nowait(message)
+                delivered += 1
+            except asyncio.QueueFull:
+                self.dropped += 1
+        self.published += delivered
+        return delivered
+
+    @asynccontextmanager
+    async def subscribe(self, user_email: str):
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers[user_email].add(queue)
+        try:
+            yield queue
+        finally:
+            queues = self._subscribers.get(user_email)
+            if queues is not None:
+                queues.discard(queue)
+                if not queues:
+                    del self._subscribers[user_email]
+
+    def stats(self) -> dict:
+        return {
+            "users": len(self._subscribers),
+            "connections": sum(len(q) for q in self._subscribers.values()),
+            "published": self.published,
+            "dropped": self.dropped,
+            "duplicates": self.duplicates,
+        }
+
+
+def format_sse(message: dict) -> bytes:
+    return b"id: %s\nevent: %s\ndata: %s\n\n" % (
+        message["id"].encode(), message["event"].encode(), dumps(message["data"])
+    )
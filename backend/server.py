@@ -1,21 +1,45 @@
-from fastapi import FastAPI, HTTPException, Depends, status, Query
+from fastapi import FastAPI, HTTPException, Depends, status, Query, Request, Body
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from motor.motor_asyncio import AsyncIOMotorClient
-from datetime import datetime, timezone, timedelta
-from typing import Optional, List
+from datetime import date, datetime, timezone, timedelta
+from typing import Any, Literal, Optional, List
+import math
 import os
+import orjson
 from dotenv import load_dotenv
-from pydantic import BaseModel, EmailStr, Field
+from pydantic import BaseModel, EmailStr, Field, ValidationError
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure, PyMongoError
 import uuid
+import asyncio
 from passlib.context import CryptContext
 from jose import JWTError, jwt
+from password_engine import PasswordEngine, PasswordEngineBusy
+from auth import InvalidToken, Principal, TokenVerifier
+from indexes import ensure_indexes, index_report
+from pagination import ASCENDING, DESCENDING, InvalidCursor, decode_cursor, fetch_page, page_list, sort_spec
+from streaming import stream_documents, stream_format, stream_items
+from responses import FastJSONResponse, dumps
+from jsonstream import InvalidJSON, JSONObjectValidator
+from blobs import BlobCollector, BlobNotFound, BlobTooLarge, GridFSBlobStore, LocalBlobStore
+from cache import TTLCache
+from invalidation import ChangeStreamTransport, InvalidationBus, supports_change_streams
+from presence import PresenceStore
+from tasks import TaskQueue
+from push import PushHub, format_sse
+from metrics import Counter, Gauge, GaugeFunc, Histogram, MetricsMiddleware, MongoCommandMetrics, Registry
+from profiling import ROUTE_QUERIES, SlowQueryLog, audit
+from migrations import conversation_key, rollup_status
 
 load_dotenv()
 
 app = FastAPI(
     title="EmeraldOrbit API",
     description="Complete backend for EmeraldOrbit platform",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=FastJSONResponse,
 )
 
 # CORS
@@ -25,12 +49,38 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Content-Range", "ETag"],
+)
+
+# Metrics
+metrics_registry = Registry()
+http_requests = metrics_registry.register(Counter(
+    "http_requests_total", "HTTP requests by route and status", ("method", "route", "status")))
+http_latency = metrics_registry.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency", ("method", "route", "status")))
+http_in_flight = metrics_registry.register(Gauge(
+    "http_requests_in_flight", "HTTP requests currently being served", ("method",)))
+mongo_latency = metrics_registry.register(Histogram(
+    "mongo_command_duration_seconds", "MongoDB command latency by collection", ("collection", "command")))
+mongo_errors = metrics_registry.register(Counter(
+    "mongo_command_errors_total", "Failed MongoDB commands by collection", ("collection", "command")))
+
+app.add_middleware(MetricsMiddleware, requests=http_requests, latency=http_latency, in_flight=http_in_flight)
+
+# Slow-query log: operations over SLOW_QUERY_MS are kept with their query
+# shape, and QUERY_SAMPLE_RATE of reads are sampled for explain() audits.
+slow_query_log = SlowQueryLog(
+    threshold_ms=float(os.environ.get("SLOW_QUERY_MS", "100")),
+    sample_rate=float(os.environ.get("QUERY_SAMPLE_RATE", "0.01")),
 )
 
 # MongoDB setup
 MONGO_URL = os.environ.get("MONGO_URL")
 DB_NAME = os.environ.get("DB_NAME", "emerald_orbit")
-client = AsyncIOMotorClient(MONGO_URL)
+client = AsyncIOMotorClient(
+    MONGO_URL,
+    event_listeners=[MongoCommandMetrics(mongo_latency, mongo_errors), slow_query_log],
+)
 db = client[DB_NAME]
 
 # Auth setup
@@ -39,6 +89,26 @@ JWT_SECRET = os.environ.get("JWT_SECRET", "emerald-secret-key")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  # 7 days
 
+# bcrypt runs on a bounded pool so auth bursts don't stall the event loop
+password_engine = PasswordEngine(
+    pwd_context,
+    max_workers=int(os.environ.get("PASSWORD_HASH_WORKERS", "4")),
+    max_queue=int(os.environ.get("PASSWORD_HASH_MAX_QUEUE", "64")),
+    retry_after=int(os.environ.get("PASSWORD_HASH_RETRY_AFTER", "1")),
+)
+
+@app.exception_handler(PasswordEngineBusy)
+async def password_engine_busy_handler(request, exc: PasswordEngineBusy):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Authentication service busy, retry shortly"},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+@app.on_event("shutdown")
+async def shutdown_password_engine():
+    password_engine.shutdown()
+
 # Collections
 users_col = db.users
 contacts_col = db.contacts
@@ -55,6 +125,60 @@ presence_col = db.user_presence
 tickets_col = db.support_tickets
 interactions_col = db.support_interactions
 sessions_col = db.collaboration_sessions
+unread_col = db.unread_counters
+
+@app.on_event("startup")
+async def bootstrap_indexes():
+    await ensure_indexes(db)
+
+# In-process caches subscribe to the invalidation bus. Routes publish their
+# own writes so this worker sees them at once; other workers hear about them
+# from the change stream (replica sets) or wait out the cache TTL.
+INVALIDATION_TRANSPORT = os.environ.get("INVALIDATION_TRANSPORT", "auto")
+invalidation_bus = InvalidationBus()
+_replica_set: Optional[bool] = None
+
+async def is_replica_set() -> bool:
+    """Whether the deployment is a replica set or mongos (change streams and
+    transactions available). Probed once per process."""
+    global _replica_set
+    if _replica_set is None:
+        _replica_set = await supports_change_streams(db)
+    return _replica_set
+
+@app.on_event("startup")
+async def start_invalidation_bus():
+    if INVALIDATION_TRANSPORT == "change_stream" or (
+        INVALIDATION_TRANSPORT == "auto" and await is_replica_set()
+    ):
+        invalidation_bus.transport = ChangeStreamTransport(
+            db, invalidation_bus.collections, invalidation_bus.operations
+        )
+    await invalidation_bus.start()
+
+@app.on_event("shutdown")
+async def stop_invalidation_bus():
+    await invalidation_bus.stop()
+
+# Profile reads for chat/presence are served from memory; writes to the user
+# document must publish a "users" change.
+user_cache = TTLCache(
+    maxsize=int(os.environ.get("USER_CACHE_SIZE", "10000")),
+    ttl=float(os.environ.get("USER_CACHE_TTL", "60")),
+)
+
+def on_user_change(operation: str, doc: Optional[dict]):
+    if doc and doc.get("email"):
+        user_cache.invalidate(doc["email"])
+    else:
+        user_cache.clear()
+
+invalidation_bus.subscribe("users", on_user_change, user_cache.clear)
+
+async def get_user_profile(email: str) -> Optional[dict]:
+    return await user_cache.get_or_load(
+        email, lambda: users_col.find_one({"email": email}, {"_id": 0, "hashed_password": 0})
+    )
 
 # ==================== MODELS ====================
 class UserCreate(BaseModel):
@@ -95,6 +219,8 @@ class PropertyCreate(BaseModel):
     images: List[str] = []
     features: List[str] = []
     description: Optional[str] = None
+    latitude: Optional[float] = Field(None, ge=-90, le=90)
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
 
 class SubscriptionCreate(BaseModel):
     tier: str = "free"
@@ -107,12 +233,18 @@ class MessageCreate(BaseModel):
     receiver_email: str
     message: str
 
+class QuotaConsume(BaseModel):
+    # defaults to the authenticated user
+    user_email: Optional[str] = None
+    resource: str
+    amount: int = Field(1, ge=1)
+
 # ==================== AUTH HELPERS ====================
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+async def hash_password(password: str) -> str:
+    return await password_engine.hash(password)
 
-def verify_password(plain: str, hashed: str) -> bool:
-    return pwd_context.verify(plain, hashed)
+async def verify_password(plain: str, hashed: str) -> bool:
+    return await password_engine.verify(plain, hashed)
 
 def create_token(data: dict) -> str:
     to_encode = data.copy()
@@ -120,11 +252,174 @@ def create_token(data: dict) -> str:
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, JWT_SECRET, algorithm=ALGORITHM)
 
+# ==================== AUTH ====================
+# The bearer token is verified once per request and the principal kept on
+# request.state. EventSource can't set headers, so only the SSE stream also
+# accepts ?access_token= (tokens in URLs end up in access logs). Until every
+# client sends tokens, routes fall back to their user_email/email query
+# parameter when no token is present; AUTH_REQUIRED=true turns that off.
+AUTH_REQUIRED = os.environ.get("AUTH_REQUIRED", "false").lower() == "true"
+token_verifier = TokenVerifier(JWT_SECRET, ALGORITHM, maxsize=int(os.environ.get("TOKEN_CACHE_SIZE", "10000")))
+bearer_scheme = HTTPBearer(auto_error=False)
+QUERY_TOKEN_PATHS = {"/api/events"}
+
+def unauthorized(detail: str) -> HTTPException:
+    return HTTPException(status_code=401, detail=detail, headers={"WWW-Authenticate": "Bearer"})
+
+async def get_principal(
+    request: Request,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer_scheme),
+) -> Optional[Principal]:
+    token = credentials.credentials if credentials else None
+    if token is None and request.url.path in QUERY_TOKEN_PATHS:
+        token = request.query_params.get("access_token")
+    if not token:
+        return None
+    try:
+        principal = token_verifier.verify(token)
+    except InvalidToken:
+        raise unauthorized("Invalid or expired token")
+    request.state.principal = principal
+    return principal
+
+def acting_user(principal: Optional[Principal], claimed: Optional[str], param: str = "user_email") -> str:
+    """The token's email, or the claimed one when no token is sent; a claim
+    that disagrees with the token is refused."""
+    if principal is not None:
+        if claimed and claimed != principal.email:
+            raise HTTPException(status_code=403, detail=f"{param} does not match the authenticated user")
+        return principal.email
+    if AUTH_REQUIRED or not claimed:
+        raise unauthorized("Not authenticated")
+    return claimed
+
+def current_user(param: str = "user_email"):
+    """Dependency resolving the acting user's email from the token, or from
+    the legacy query parameter when no token is sent."""
+    async def dependency(request: Request, principal: Optional[Principal] = Depends(get_principal)) -> str:
+        return acting_user(principal, request.query_params.get(param), param)
+    return dependency
+
+current_user_email = current_user("user_email")
+
+async def require_admin(principal: Optional[Principal] = Depends(get_principal)) -> str:
+    """Admin routes always need a bearer token for a user with role "admin",
+    whatever AUTH_REQUIRED says."""
+    if principal is None:
+        raise unauthorized("Not authenticated")
+    user = await get_user_profile(principal.email)
+    if not user or user.get("role") != "admin" or not user.get("is_active", True):
+        raise HTTPException(status_code=403, detail="Admin role required")
+    return principal.email
+
 def serialize_doc(doc: dict) -> dict:
     if doc and "_id" in doc:
         doc["_id"] = str(doc["_id"])
     return doc
 
+# ==================== PAGINATION ====================
+# List routes return one page; the cursor for the next page is sent in the
+# X-Next-Cursor header so response bodies stay plain lists. Pages are returned
+# as FastJSONResponse directly to skip jsonable_encoder.
+DEFAULT_PAGE_SIZE = int(os.environ.get("DEFAULT_PAGE_SIZE", "100"))
+MAX_PAGE_SIZE = int(os.environ.get("MAX_PAGE_SIZE", "1000"))
+
+class Page(BaseModel):
+    cursor: Optional[str] = None
+    limit: int = DEFAULT_PAGE_SIZE
+
+def page_params(default_limit: int = DEFAULT_PAGE_SIZE):
+    def dependency(
+        cursor: Optional[str] = None,
+        limit: int = Query(default_limit, ge=1, le=MAX_PAGE_SIZE),
+    ) -> Page:
+        return Page(cursor=cursor, limit=limit)
+    return dependency
+
+async def paginate(
+    collection,
+    query: dict,
+    page: Page,
+    projection: Optional[dict] = None,
+    sort_field: str = "created_date",
+    direction: int = DESCENDING,
+    reverse: bool = False,
+) -> FastJSONResponse:
+    try:
+        items, next_cursor = await fetch_page(
+            collection, query, projection if projection is not None else {"_id": 0},
+            sort_field=sort_field, direction=direction, cursor=page.cursor, limit=page.limit,
+        )
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if reverse:
+        # page walks backwards but is returned in reading order
+        items.reverse()
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+    return FastJSONResponse(items, headers=headers)
+
+def fields_projection(fields: Optional[str], allowed: set, sort_field: str = "created_date") -> Optional[dict]:
+    """Turn ?fields=a,b into a projection limited to the collection's
+    allow-list. id and the sort field are always kept so the next cursor
+    can still be built."""
+    if not fields:
+        return None
+    wanted = {f.strip() for f in fields.split(",") if f.strip()}
+    unknown = wanted - allowed
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    projection = {"_id": 0, "id": 1, sort_field: 1}
+    projection.update(dict.fromkeys(wanted, 1))
+    return projection
+
+def fields_param(allowed: set, sort_field: str = "created_date"):
+    def dependency(fields: Optional[str] = Query(None, description="Comma-separated fields to return")) -> Optional[dict]:
+        return fields_projection(fields, allowed, sort_field)
+    return dependency
+
+async def insert_doc(collection, doc: dict) -> FastJSONResponse:
+    """Insert and echo the document back without copying it to drop _id."""
+    await collection.insert_one(doc)
+    doc.pop("_id", None)
+    return FastJSONResponse(doc)
+
+# ==================== BATCH WRITES ====================
+# Batch routes validate each item on its own and run one unordered
+# insert_many, so one bad record doesn't sink the rest of the batch.
+MAX_BATCH_SIZE = int(os.environ.get("MAX_BATCH_SIZE", "1000"))
+
+def check_batch_size(items: list):
+    if not items:
+        raise HTTPException(status_code=400, detail="Batch is empty")
+    if len(items) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"Batch exceeds {MAX_BATCH_SIZE} items")
+
+def validation_error(e: ValidationError) -> dict:
+    return {"ok": False, "error": [{"loc": list(err["loc"]), "msg": err["msg"]} for err in e.errors()]}
+
+async def insert_batch(collection, docs: list, results: list) -> list:
+    """Insert (index, doc) pairs and fill results[index]; returns inserted docs."""
+    if not docs:
+        return []
+    failed = {}
+    try:
+        await collection.insert_many([doc for _, doc in docs], ordered=False)
+    except BulkWriteError as e:
+        failed = {err["index"]: err.get("errmsg", "write failed") for err in e.details.get("writeErrors", [])}
+    inserted = []
+    for pos, (index, doc) in enumerate(docs):
+        doc.pop("_id", None)
+        if pos in failed:
+            results[index] = {"ok": False, "error": failed[pos]}
+        else:
+            results[index] = {"ok": True, "id": doc["id"]}
+            inserted.append(doc)
+    return inserted
+
+def batch_summary(results: list) -> dict:
+    inserted = sum(1 for r in results if r["ok"])
+    return {"inserted": inserted, "failed": len(results) - inserted, "results": results}
+
 # ==================== ROUTES ====================
 @app.get("/")
 async def root():
@@ -134,29 +429,116 @@ async def root():
 async def health():
     try:
         await db.command("ping")
-        return {"status": "healthy", "database": "connected"}
+        return {
+            "status": "healthy",
+            "database": "connected",
+            "password_engine": password_engine.stats(),
+            "user_cache": user_cache.stats(),
+            "quota_cache": quota_exhausted.stats(),
+            "invalidation": invalidation_bus.stats(),
+            "token_cache": token_verifier.stats(),
+            "background_tasks": background_tasks.stats(),
+            "presence": presence_store.stats(),
+            "push": push_hub.stats(),
+            "payload_gc": payload_collector.stats(),
+        }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# ==================== METRICS ====================
+for _name, _help, _fn in [
+    ("password_engine_queue_depth", "bcrypt calls waiting for a worker", lambda: password_engine.queue_depth),
+    ("password_engine_in_flight", "bcrypt calls running", lambda: password_engine.stats()["in_flight"]),
+    ("password_engine_rejected_total", "bcrypt calls rejected with 503", lambda: password_engine.rejected),
+    ("user_cache_hits_total", "User profile cache hits", lambda: user_cache.hits),
+    ("user_cache_misses_total", "User profile cache misses", lambda: user_cache.misses),
+    ("user_cache_size", "User profiles cached", lambda: user_cache.stats()["size"]),
+    ("presence_users", "Users tracked by the presence store", lambda: len(presence_store.entries)),
+    ("presence_dirty", "Presence entries awaiting flush", lambda: presence_store.stats()["dirty"]),
+    ("push_connections", "Open SSE connections", lambda: push_hub.stats()["connections"]),
+]:
+    metrics_registry.register(GaugeFunc(_name, _help, _fn))
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4")
+
+# explain() and $indexStats run against the primary, so these are admin-only
+@app.get("/api/admin/indexes", dependencies=[Depends(require_admin)])
+async def get_index_report():
+    return await index_report(db)
+
+@app.get("/api/admin/slow-queries", dependencies=[Depends(require_admin)])
+async def get_slow_queries(limit: int = Query(100, ge=1, le=1000)):
+    return {"threshold_ms": slow_query_log.threshold_ms, "queries": slow_query_log.slow_queries(limit)}
+
+@app.get("/api/admin/query-audit", dependencies=[Depends(require_admin)])
+async def get_query_audit(include_routes: bool = True):
+    queries = slow_query_log.sampled()
+    if include_routes:
+        queries = queries + ROUTE_QUERIES
+    report = await audit(db, queries)
+    return {"flagged": [r for r in report if r.get("issues")], "report": report}
+
 # ==================== AUTH ====================
+# Registration relies on the email_unique index instead of a lookup, and
+# writes the user and default subscription in one transaction when the
+# deployment supports them (replica set / mongos, same probe as change
+# streams; USE_TRANSACTIONS=on|off overrides it). On a standalone server the
+# user is deleted again if the subscription insert fails. The welcome
+# notification is queued.
+USE_TRANSACTIONS = os.environ.get("USE_TRANSACTIONS", "auto")
+background_tasks = TaskQueue(
+    workers=int(os.environ.get("BACKGROUND_WORKERS", "2")),
+    max_size=int(os.environ.get("BACKGROUND_QUEUE_SIZE", "1000")),
+)
+use_transactions = False
+
+@app.on_event("startup")
+async def start_background_tasks():
+    global use_transactions
+    use_transactions = USE_TRANSACTIONS == "on" or (USE_TRANSACTIONS == "auto" and await is_replica_set())
+    background_tasks.start()
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    await background_tasks.stop()
+
+async def insert_registration(user_doc: dict, sub_doc: dict):
+    if use_transactions:
+        async def write(session):
+            await users_col.insert_one(user_doc, session=session)
+            await subscriptions_col.insert_one(sub_doc, session=session)
+        async with await client.start_session() as session:
+            await session.with_transaction(write)
+        return
+    await users_col.insert_one(user_doc)
+    try:
+        await subscriptions_col.insert_one(sub_doc)
+    except PyMongoError:
+        await users_col.delete_one({"id": user_doc["id"]})
+        raise
+
+async def send_welcome_notification(email: str, full_name: str):
+    await create_notification({
+        "user_email": email,
+        "type": "welcome",
+        "title": "Welcome to Emerald Orbit",
+        "message": f"Hi {full_name or email}, your account is ready.",
+    })
+
 @app.post("/api/auth/register")
 async def register(user: UserCreate):
-    existing = await users_col.find_one({"email": user.email})
-    if existing:
-        raise HTTPException(status_code=400, detail="Email already registered")
-    
     user_doc = {
         "id": str(uuid.uuid4()),
         "email": user.email,
         "full_name": user.full_name,
-        "hashed_password": hash_password(user.password),
+        "hashed_password": await hash_password(user.password),
         "role": "user",
         "is_active": True,
         "created_at": datetime.now(timezone.utc).isoformat()
     }
-    await users_col.insert_one(user_doc)
-    
-    # Create default subscription
+    # Default subscription
     sub_doc = {
         "id": str(uuid.uuid4()),
         "user_email": user.email,
@@ -172,15 +554,20 @@ async def register(user: UserCreate):
         "advanced_features_enabled": False,
         "created_date": datetime.now(timezone.utc).isoformat()
     }
-    await subscriptions_col.insert_one(sub_doc)
-    
+    try:
+        await insert_registration(user_doc, sub_doc)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Email already registered")
+    invalidation_bus.publish("users", "insert", {"email": user.email})
+    background_tasks.submit(send_welcome_notification, user.email, user.full_name)
+
     token = create_token({"sub": user.email})
     return {"token": token, "user": {"email": user.email, "full_name": user.full_name}}
 
 @app.post("/api/auth/login")
 async def login(user: UserLogin):
     db_user = await users_col.find_one({"email": user.email})
-    if not db_user or not verify_password(user.password, db_user["hashed_password"]):
+    if not db_user or not await verify_password(user.password, db_user["hashed_password"]):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
     token = create_token({"sub": user.email})
@@ -195,38 +582,43 @@ async def login(user: UserLogin):
     }
 
 @app.get("/api/auth/me")
-async def get_me(email: str):
-    user = await users_col.find_one({"email": email}, {"_id": 0, "hashed_password": 0})
+async def get_me(email: str = Depends(current_user("email"))):
+    user = await get_user_profile(email)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return user
 
 @app.put("/api/auth/me")
-async def update_me(email: str, full_name: Optional[str] = None):
+async def update_me(email: str = Depends(current_user("email")), full_name: Optional[str] = None):
     update_data = {}
     if full_name:
         update_data["full_name"] = full_name
     
     if update_data:
         await users_col.update_one({"email": email}, {"$set": update_data})
+        invalidation_bus.publish("users", "update", {"email": email})
     
-    user = await users_col.find_one({"email": email}, {"_id": 0, "hashed_password": 0})
+    user = await get_user_profile(email)
     return user
 
 # ==================== CONTACTS ====================
+CONTACT_FIELDS = set(ContactCreate.model_fields) | {"id", "user_email", "created_date"}
+
 @app.get("/api/contacts")
-async def get_contacts(user_email: str):
-    contacts = await contacts_col.find({"user_email": user_email}, {"_id": 0}).to_list(1000)
-    return contacts
+async def get_contacts(
+    user_email: str = Depends(current_user_email),
+    page: Page = Depends(page_params()),
+    projection: Optional[dict] = Depends(fields_param(CONTACT_FIELDS)),
+):
+    return await paginate(contacts_col, {"user_email": user_email}, page, projection)
 
 @app.post("/api/contacts")
-async def create_contact(contact: ContactCreate, user_email: str):
+async def create_contact(contact: ContactCreate, user_email: str = Depends(current_user_email)):
     doc = contact.model_dump()
     doc["id"] = str(uuid.uuid4())
     doc["user_email"] = user_email
     doc["created_date"] = datetime.now(timezone.utc).isoformat()
-    await contacts_col.insert_one(doc)
-    return {k: v for k, v in doc.items() if k != "_id"}
+    return await insert_doc(contacts_col, doc)
 
 @app.put("/api/contacts/{contact_id}")
 async def update_contact(contact_id: str, contact: ContactCreate):
@@ -244,36 +636,330 @@ async def delete_contact(contact_id: str):
 
 # ==================== CALLS ====================
 @app.get("/api/calls")
-async def get_calls(user_email: str, limit: int = 50):
-    calls = await calls_col.find({"user_email": user_email}, {"_id": 0}).sort("created_date", -1).limit(limit).to_list(limit)
-    return calls
+async def get_calls(user_email: str = Depends(current_user_email), page: Page = Depends(page_params(50))):
+    return await paginate(calls_col, {"user_email": user_email}, page)
 
 @app.post("/api/calls")
 async def log_call(call_data: dict):
     call_data["id"] = str(uuid.uuid4())
     call_data["created_date"] = datetime.now(timezone.utc).isoformat()
-    await calls_col.insert_one(call_data)
-    return {k: v for k, v in call_data.items() if k != "_id"}
+    return await insert_doc(calls_col, call_data)
+
+@app.post("/api/calls:batch")
+async def log_calls_batch(calls: List[dict] = Body(...)):
+    check_batch_size(calls)
+    results = [None] * len(calls)
+    docs = []
+    for index, call_data in enumerate(calls):
+        call_data["id"] = str(uuid.uuid4())
+        call_data["created_date"] = datetime.now(timezone.utc).isoformat()
+        docs.append((index, call_data))
+    await insert_batch(calls_col, docs, results)
+    return batch_summary(results)
 
 # ==================== PROPERTIES ====================
+PROPERTY_FIELDS = set(PropertyCreate.model_fields) | {"id", "user_email", "created_date"}
+
 @app.get("/api/properties")
-async def get_properties(status: Optional[str] = None, property_type: Optional[str] = None):
+async def get_properties(
+    status: Optional[str] = None,
+    property_type: Optional[str] = None,
+    page: Page = Depends(page_params()),
+    projection: Optional[dict] = Depends(fields_param(PROPERTY_FIELDS)),
+):
     query = {}
     if status:
         query["status"] = status
     if property_type:
         query["property_type"] = property_type
-    properties = await properties_col.find(query, {"_id": 0}).to_list(1000)
-    return properties
+    return await paginate(properties_col, query, page, projection)
+
+# Sort keys for search; each is backed by a (prefix..., field, id) index.
+PROPERTY_SORTS = {
+    "newest": ("created_date", DESCENDING),
+    "price_asc": ("price", ASCENDING),
+    "price_desc": ("price", DESCENDING),
+    "sqft_desc": ("sqft", DESCENDING),
+}
+# List views only need a card: no features/description, first image only
+PROPERTY_CARD_FIELDS = [
+    "id", "title", "city", "state", "zip_code", "price", "property_type",
+    "status", "bedrooms", "bathrooms", "sqft", "images",
+]
+PRICE_FACET_BOUNDARIES = [0, 100_000, 250_000, 500_000, 750_000, 1_000_000, 2_000_000]
+# Map pins: the card plus coordinates
+PROPERTY_PIN_FIELDS = PROPERTY_CARD_FIELDS + ["latitude", "longitude"]
+GEO_MAX_RADIUS_M = 100_000
+GEO_MAX_RESULTS = 500
+GEO_MAX_CLUSTERS = 1000
+# Below this zoom the map gets grid clusters instead of individual listings
+CLUSTER_MAX_ZOOM = 15
+CLUSTER_CELLS_PER_TILE = 8
+# Viewport polygons: at most this many degrees of longitude per polygon, with
+# a vertex every GEO_EDGE_STEP degrees along the top and bottom edges
+GEO_SLICE_DEGREES = 90.0
+GEO_EDGE_STEP = 1.0
+# polygon edges stop short of the poles, where every vertex would coincide
+GEO_MAX_POLYGON_LAT = 89.999
+
+def add_range(query: dict, field: str, low, high):
+    bounds = {}
+    if low is not None:
+        bounds["$gte"] = low
+    if high is not None:
+        bounds["$lte"] = high
+    if bounds:
+        query[field] = bounds
+
+def property_projection(fields: Optional[str], sort_field: str, default: List[str] = PROPERTY_CARD_FIELDS) -> dict:
+    if fields:
+        return fields_projection(fields, PROPERTY_FIELDS, sort_field)
+    projection = {"_id": 0, "id": 1, sort_field: 1}
+    projection.update(dict.fromkeys(default, 1))
+    projection["images"] = {"$slice": 1}
+    return projection
+
+def count_by(field: str) -> list:
+    return [{"$group": {"_id": field, "count": {"$sum": 1}}}, {"$sort": {"count": -1, "_id": 1}}]
+
+async def property_facets(query: dict) -> dict:
+    pipeline = [
+        {"$match": query},
+        {"$facet": {
+            "total": [{"$count": "count"}],
+            "status": count_by("$status"),
+            "property_type": count_by("$property_type"),
+            "bedrooms": count_by("$bedrooms"),
+            "price": [{"$bucket": {
+                "groupBy": "$price",
+                "boundaries": PRICE_FACET_BOUNDARIES,
+                "default": "2000000+",
+            }}],
+        }},
+    ]
+    result = await properties_col.aggregate(pipeline).to_list(1)
+    raw = result[0] if result else {}
+    total = raw.get("total") or [{"count": 0}]
+    facets = {
+        name: [{"value": b["_id"], "count": b["count"]} for b in raw.get(name, [])]
+        for name in ("status", "property_type", "bedrooms", "price")
+    }
+    return {"total": total[0]["count"], **facets}
+
+@app.get("/api/properties/search")
+async def search_properties(
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    min_bedrooms: Optional[int] = None,
+    max_bedrooms: Optional[int] = None,
+    min_bathrooms: Optional[float] = None,
+    max_bathrooms: Optional[float] = None,
+    min_sqft: Optional[int] = None,
+    max_sqft: Optional[int] = None,
+    city: Optional[str] = None,
+    state: Optional[str] = None,
+    zip_code: Optional[str] = None,
+    status: Optional[str] = None,
+    property_type: Optional[str] = None,
+    sort: str = "newest",
+    fields: Optional[str] = None,
+    facets: bool = True,
+    page: Page = Depends(page_params(24)),
+):
+    if sort not in PROPERTY_SORTS:
+        raise HTTPException(status_code=400, detail=f"sort must be one of: {', '.join(PROPERTY_SORTS)}")
+    sort_field, direction = PROPERTY_SORTS[sort]
+
+    query = {}
+    for field, value in (("city", city), ("state", state), ("zip_code", zip_code),
+                         ("status", status), ("property_type", property_type)):
+        if value:
+            query[field] = value
+    add_range(query, "price", min_price, max_price)
+    add_range(query, "bedrooms", min_bedrooms, max_bedrooms)
+    add_range(query, "bathrooms", min_bathrooms, max_bathrooms)
+    add_range(query, "sqft", min_sqft, max_sqft)
+
+    projection = property_projection(fields, sort_field)
+    items_task = fetch_page(
+        properties_col, query, projection,
+        sort_field=sort_field, direction=direction, cursor=page.cursor, limit=page.limit,
+    )
+    try:
+        # facets describe the whole result set and are identical on every
+        # page, so only the first page computes them
+        if facets and not page.cursor:
+            (items, next_cursor), facet_counts = await asyncio.gather(items_task, property_facets(query))
+        else:
+            items, next_cursor = await items_task
+            facet_counts = None
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return FastJSONResponse({"items": items, "next_cursor": next_cursor, "facets": facet_counts})
+
+def property_location(prop: PropertyCreate) -> Optional[dict]:
+    if prop.latitude is None and prop.longitude is None:
+        return None
+    if prop.latitude is None or prop.longitude is None:
+        raise HTTPException(status_code=400, detail="latitude and longitude must be set together")
+    # GeoJSON order is [longitude, latitude]
+    return {"type": "Point", "coordinates": [prop.longitude, prop.latitude]}
+
+def map_filters(status: Optional[str], property_type: Optional[str],
+                min_price: Optional[float], max_price: Optional[float]) -> dict:
+    query = {}
+    if status:
+        query["status"] = status
+    if property_type:
+        query["property_type"] = property_type
+    add_range(query, "price", min_price, max_price)
+    return query
+
+def pipeline_projection(projection: dict) -> dict:
+    # find() accepts {"$slice": n}; $project needs the expression form
+    if isinstance(projection.get("images"), dict):
+        projection = {**projection, "images": {"$slice": ["$images", 1]}}
+    return projection
+
+def parallel_sag(lat: float, step: float) -> float:
+    """How far (degrees of latitude) a great-circle edge between two vertices
+    step degrees apart on a parallel strays from that parallel."""
+    if abs(lat) >= 90:
+        return 0.0
+    mid = math.degrees(math.atan(math.tan(math.radians(abs(lat))) / math.cos(math.radians(step / 2))))
+    return mid - abs(lat)
+
+def bbox_query(min_lat: float, min_lng: float, max_lat: float, max_lng: float) -> dict:
+    """Properties inside a lat/lng viewport. GeoJSON polygon edges are great
+    circles, not parallels, so the index filter uses polygons under 180° wide
+    (no big-polygon CRS), with extra vertices along the parallels, padded by
+    the worst-case sag. An exact range check on latitude/longitude then trims
+    the padding. A viewport spanning every longitude skips the geo filter."""
+    crosses = min_lng > max_lng
+    width = max_lng - min_lng + (360.0 if crosses else 0.0)
+    if width <= 0:
+        raise HTTPException(status_code=400, detail="min_lng and max_lng must differ")
+    exact = {"latitude": {"$gte": min_lat, "$lte": max_lat}}
+    if width >= 360:
+        return {"location": {"$exists": True}, **exact}
+    exact["longitude"] = {"$not": {"$gt": max_lng, "$lt": min_lng}} if crosses else {"$gte": min_lng, "$lte": max_lng}
+
+    pad = 2 * max(parallel_sag(min_lat, GEO_EDGE_STEP), parallel_sag(max_lat, GEO_EDGE_STEP))
+    south = max(min_lat - pad, -GEO_MAX_POLYGON_LAT)
+    north = min(max_lat + pad, GEO_MAX_POLYGON_LAT)
+    intervals = [(min_lng, 180.0), (-180.0, max_lng)] if crosses else [(min_lng, max_lng)]
+    branches = []
+    for west, east in intervals:
+        slices = math.ceil((east - west) / GEO_SLICE_DEGREES)
+        for i in range(slices):
+            a = west + (east - west) * i / slices
+            b = west + (east - west) * (i + 1) / slices
+            steps = max(1, math.ceil((b - a) / GEO_EDGE_STEP))
+            lngs = [a + (b - a) * k / steps for k in range(steps + 1)]
+            ring = [[lng, south] for lng in lngs] + [[lng, north] for lng in reversed(lngs)] + [[a, south]]
+            branches.append({"location": {"$geoWithin": {"$geometry": {"type": "Polygon", "coordinates": [ring]}}}})
+    return {**(branches[0] if len(branches) == 1 else {"$or": branches}), **exact}
+
+async def cluster_properties(query: dict, zoom: int) -> list:
+    cell = 360.0 / (2 ** zoom) / CLUSTER_CELLS_PER_TILE
+    lng = {"$arrayElemAt": ["$location.coordinates", 0]}
+    lat = {"$arrayElemAt": ["$location.coordinates", 1]}
+    pipeline = [
+        {"$match": query},
+        {"$group": {
+            "_id": {"x": {"$floor": {"$divide": [lng, cell]}}, "y": {"$floor": {"$divide": [lat, cell]}}},
+            "count": {"$sum": 1},
+            "lng": {"$avg": lng},
+            "lat": {"$avg": lat},
+            "min_price": {"$min": "$price"},
+            "max_price": {"$max": "$price"},
+            "property_id": {"$first": "$id"},
+        }},
+        {"$sort": {"count": -1}},
+        {"$limit": GEO_MAX_CLUSTERS},
+    ]
+    clusters = await properties_col.aggregate(pipeline).to_list(GEO_MAX_CLUSTERS)
+    return [
+        {
+            "latitude": c["lat"],
+            "longitude": c["lng"],
+            "count": c["count"],
+            "min_price": c["min_price"],
+            "max_price": c["max_price"],
+            # single-listing cells can link straight to the property
+            "property_id": c["property_id"] if c["count"] == 1 else None,
+        }
+        for c in clusters
+    ]
+
+@app.get("/api/properties/near")
+async def properties_near(
+    lat: float = Query(..., ge=-90, le=90),
+    lng: float = Query(..., ge=-180, le=180),
+    radius_m: float = Query(5000, gt=0, le=GEO_MAX_RADIUS_M),
+    status: Optional[str] = None,
+    property_type: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    fields: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=GEO_MAX_RESULTS),
+):
+    projection = pipeline_projection(property_projection(fields, "id", PROPERTY_PIN_FIELDS))
+    projection["distance_m"] = 1
+    pipeline = [
+        {"$geoNear": {
+            "near": {"type": "Point", "coordinates": [lng, lat]},
+            "key": "location",
+            "distanceField": "distance_m",
+            "maxDistance": radius_m,
+            "spherical": True,
+            "query": map_filters(status, property_type, min_price, max_price),
+        }},
+        {"$limit": limit},
+        {"$project": projection},
+    ]
+    items = await properties_col.aggregate(pipeline).to_list(limit)
+    return FastJSONResponse({"items": items})
+
+@app.get("/api/properties/within")
+async def properties_within(
+    min_lat: float = Query(..., ge=-90, le=90),
+    min_lng: float = Query(..., ge=-180, le=180),
+    max_lat: float = Query(..., ge=-90, le=90),
+    max_lng: float = Query(..., ge=-180, le=180),
+    zoom: Optional[int] = Query(None, ge=0, le=22),
+    status: Optional[str] = None,
+    property_type: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    fields: Optional[str] = None,
+    limit: int = Query(200, ge=1, le=GEO_MAX_RESULTS),
+):
+    if min_lat >= max_lat:
+        raise HTTPException(status_code=400, detail="min_lat must be below max_lat")
+    query = {**bbox_query(min_lat, min_lng, max_lat, max_lng),
+             **map_filters(status, property_type, min_price, max_price)}
+
+    try:
+        if zoom is not None and zoom < CLUSTER_MAX_ZOOM:
+            return FastJSONResponse({"mode": "clusters", "clusters": await cluster_properties(query, zoom)})
+        projection = property_projection(fields, "id", PROPERTY_PIN_FIELDS)
+        items = await properties_col.find(query, projection).limit(limit + 1).to_list(limit + 1)
+    except OperationFailure as e:
+        # e.g. a sliver viewport whose polygon the server rejects as degenerate
+        raise HTTPException(status_code=400, detail=(e.details or {}).get("errmsg", str(e)))
+    return FastJSONResponse({"mode": "listings", "items": items[:limit], "truncated": len(items) > limit})
 
 @app.post("/api/properties")
-async def create_property(prop: PropertyCreate, user_email: str):
+async def create_property(prop: PropertyCreate, user_email: str = Depends(current_user_email)):
     doc = prop.model_dump()
+    location = property_location(prop)
+    if location:
+        doc["location"] = location
     doc["id"] = str(uuid.uuid4())
     doc["user_email"] = user_email
     doc["created_date"] = datetime.now(timezone.utc).isoformat()
-    await properties_col.insert_one(doc)
-    return {k: v for k, v in doc.items() if k != "_id"}
+    return await insert_doc(properties_col, doc)
 
 @app.get("/api/properties/{property_id}")
 async def get_property(property_id: str):
@@ -284,7 +970,14 @@ async def get_property(property_id: str):
 
 @app.put("/api/properties/{property_id}")
 async def update_property(property_id: str, prop: PropertyCreate):
-    result = await properties_col.update_one({"id": property_id}, {"$set": prop.model_dump()})
+    fields = prop.model_dump()
+    location = property_location(prop)
+    update = {"$set": fields}
+    if location:
+        fields["location"] = location
+    else:
+        update["$unset"] = {"location": ""}
+    result = await properties_col.update_one({"id": property_id}, update)
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Property not found")
     return {"message": "Updated"}
@@ -297,139 +990,441 @@ async def delete_property(property_id: str):
     return {"message": "Deleted"}
 
 # ==================== SUBSCRIPTIONS ====================
+SUBSCRIPTION_FIELDS = {
+    "id", "user_email", "tier", "advanced_features_enabled", "created_date",
+    "sofia_message_limit", "sofia_messages_used", "image_generation_limit", "image_generations_used",
+    "music_generation_limit", "music_generations_used", "video_generation_limit", "video_generations_used",
+}
+
 @app.get("/api/subscriptions")
-async def get_subscriptions(user_email: str):
-    subs = await subscriptions_col.find({"user_email": user_email}, {"_id": 0}).to_list(100)
-    return subs
+async def get_subscriptions(
+    user_email: str = Depends(current_user_email),
+    page: Page = Depends(page_params()),
+    projection: Optional[dict] = Depends(fields_param(SUBSCRIPTION_FIELDS)),
+):
+    return await paginate(subscriptions_col, {"user_email": user_email}, page, projection)
 
 @app.get("/api/subscriptions/all")
-async def get_all_subscriptions():
-    subs = await subscriptions_col.find({}, {"_id": 0}).to_list(1000)
-    return subs
+async def get_all_subscriptions(
+    request: Request,
+    page: Page = Depends(page_params()),
+    projection: Optional[dict] = Depends(fields_param(SUBSCRIPTION_FIELDS)),
+):
+    fmt = stream_format(request)
+    if fmt:
+        cursor = subscriptions_col.find({}, projection or {"_id": 0}).sort(sort_spec("created_date"))
+        return stream_documents(cursor, fmt)
+    return await paginate(subscriptions_col, {}, page, projection)
 
 @app.put("/api/subscriptions/{sub_id}")
 async def update_subscription(sub_id: str, data: dict):
-    result = await subscriptions_col.update_one({"id": sub_id}, {"$set": data})
-    if result.matched_count == 0:
+    sub = await subscriptions_col.find_one_and_update(
+        {"id": sub_id}, {"$set": data}, projection={"_id": 0, "user_email": 1}
+    )
+    if not sub:
         raise HTTPException(status_code=404, detail="Subscription not found")
+    # limits or usage may have changed
+    invalidation_bus.publish("subscriptions", "update", sub)
     return {"message": "Updated"}
 
+# ==================== QUOTAS ====================
+# Usage is only ever changed by one conditional $inc, so concurrent consumers
+# can't overshoot the limit. Resources known to be exhausted are remembered
+# briefly so bursts of rejected requests don't each cost a round trip.
+QUOTA_FIELDS = {
+    "sofia_messages": ("sofia_message_limit", "sofia_messages_used"),
+    "image_generations": ("image_generation_limit", "image_generations_used"),
+    "music_generations": ("music_generation_limit", "music_generations_used"),
+    "video_generations": ("video_generation_limit", "video_generations_used"),
+}
+quota_exhausted = TTLCache(
+    maxsize=int(os.environ.get("QUOTA_CACHE_SIZE", "10000")),
+    ttl=float(os.environ.get("QUOTA_CACHE_TTL", "30")),
+)
+
+def on_subscription_change(operation: str, doc: Optional[dict]):
+    if doc and doc.get("user_email"):
+        for resource in QUOTA_FIELDS:
+            quota_exhausted.invalidate((doc["user_email"], resource))
+    else:
+        quota_exhausted.clear()
+
+invalidation_bus.subscribe("subscriptions", on_subscription_change, quota_exhausted.clear)
+
+class QuotaExceeded(Exception):
+    pass
+
+def check_resource(resource: str):
+    if resource not in QUOTA_FIELDS:
+        raise HTTPException(status_code=400, detail=f"resource must be one of: {', '.join(QUOTA_FIELDS)}")
+
+async def consume_quota(user_email: str, resource: str, amount: int = 1) -> dict:
+    """Atomically add amount to usage if it stays within the limit."""
+    if quota_exhausted.get((user_email, resource)):
+        raise QuotaExceeded(resource)
+    limit_field, used_field = QUOTA_FIELDS[resource]
+    # a missing or null counter (legacy / hand-edited documents) counts as 0
+    used_after = {"$add": [{"$ifNull": [f"${used_field}", 0]}, amount]}
+    sub = await subscriptions_col.find_one_and_update(
+        {
+            "user_email": user_email,
+            "$expr": {"$lte": [used_after, {"$ifNull": [f"${limit_field}", 0]}]},
+        },
+        # pipeline form, since $inc fails on a null counter
+        [{"$set": {used_field: used_after}}],
+        projection={"_id": 0, limit_field: 1, used_field: 1},
+        sort=sort_spec("created_date"),
+    )
+    if sub is None:
+        current = await subscriptions_col.find_one(
+            {"user_email": user_email}, {"_id": 0, limit_field: 1, used_field: 1}, sort=sort_spec("created_date")
+        )
+        if current is None:
+            raise HTTPException(status_code=404, detail="Subscription not found")
+        # only remember "nothing left"; a smaller amount may still fit
+        if (current.get(used_field) or 0) >= (current.get(limit_field) or 0):
+            quota_exhausted.set((user_email, resource), True)
+        raise QuotaExceeded(resource)
+    # sub is the pre-update document
+    used, limit = (sub.get(used_field) or 0) + amount, sub.get(limit_field) or 0
+    if used >= limit:
+        quota_exhausted.set((user_email, resource), True)
+    return {"resource": resource, "used": used, "limit": limit, "remaining": limit - used}
+
+@app.exception_handler(QuotaExceeded)
+async def quota_exceeded_handler(request: Request, exc: QuotaExceeded):
+    return JSONResponse(status_code=429, content={"detail": f"Quota exceeded for {exc}"})
+
+@app.post("/api/quota/consume")
+async def consume(item: QuotaConsume, principal: Optional[Principal] = Depends(get_principal)):
+    check_resource(item.resource)
+    return await consume_quota(acting_user(principal, item.user_email), item.resource, item.amount)
+
+@app.post("/api/quota/consume:batch")
+async def consume_batch(items: List[dict] = Body(...), principal: Optional[Principal] = Depends(get_principal)):
+    """Items for the same user and resource are summed and consumed together
+    (all or nothing), one conditional update per group."""
+    check_batch_size(items)
+    if principal is None and AUTH_REQUIRED:
+        raise unauthorized("Not authenticated")
+    results = [None] * len(items)
+    groups = {}
+    for index, item in enumerate(items):
+        try:
+            parsed = QuotaConsume.model_validate(item)
+        except ValidationError as e:
+            results[index] = validation_error(e)
+            continue
+        if parsed.resource not in QUOTA_FIELDS:
+            results[index] = {"ok": False, "error": f"Unknown resource {parsed.resource}"}
+            continue
+        try:
+            user_email = acting_user(principal, parsed.user_email)
+        except HTTPException as e:
+            results[index] = {"ok": False, "error": e.detail}
+            continue
+        group = groups.setdefault((user_email, parsed.resource), [0, []])
+        group[0] += parsed.amount
+        group[1].append(index)
+
+    async def consume_group(key, amount):
+        try:
+            return {"ok": True, **await consume_quota(key[0], key[1], amount)}
+        except QuotaExceeded:
+            return {"ok": False, "error": "Quota exceeded"}
+        except HTTPException as e:
+            return {"ok": False, "error": e.detail}
+
+    outcomes = await asyncio.gather(*(consume_group(key, amount) for key, (amount, _) in groups.items()))
+    for (_, indexes), outcome in zip(groups.values(), outcomes):
+        for index in indexes:
+            results[index] = outcome
+    consumed = sum(1 for r in results if r["ok"])
+    return {"consumed": consumed, "rejected": len(results) - consumed, "results": results}
+
+@app.get("/api/quota")
+async def get_quota(user_email: str = Depends(current_user_email)):
+    projection = {"_id": 0}
+    for limit_field, used_field in QUOTA_FIELDS.values():
+        projection[limit_field] = 1
+        projection[used_field] = 1
+    sub = await subscriptions_col.find_one({"user_email": user_email}, projection, sort=sort_spec("created_date"))
+    if not sub:
+        raise HTTPException(status_code=404, detail="Subscription not found")
+    quotas = {}
+    for resource, (limit_field, used_field) in QUOTA_FIELDS.items():
+        limit, used = sub.get(limit_field) or 0, sub.get(used_field) or 0
+        quotas[resource] = {"used": used, "limit": limit, "remaining": max(limit - used, 0)}
+    return FastJSONResponse(quotas)
+
 # ==================== SONGS/MUSIC ====================
 @app.get("/api/songs")
-async def get_songs(user_email: Optional[str] = None):
+async def get_songs(
+    request: Request,
+    user_email: Optional[str] = None,
+    page: Page = Depends(page_params()),
+):
     query = {"user_email": user_email} if user_email else {}
-    songs = await songs_col.find(query, {"_id": 0}).to_list(1000)
-    return songs
+    fmt = stream_format(request)
+    if fmt:
+        return stream_documents(songs_col.find(query, {"_id": 0}).sort(sort_spec("created_date")), fmt)
+    return await paginate(songs_col, query, page)
 
 @app.post("/api/songs")
 async def create_song(song_data: dict):
     song_data["id"] = str(uuid.uuid4())
     song_data["created_date"] = datetime.now(timezone.utc).isoformat()
-    await songs_col.insert_one(song_data)
-    return {k: v for k, v in song_data.items() if k != "_id"}
+    return await insert_doc(songs_col, song_data)
 
 # ==================== NOTIFICATIONS ====================
 @app.get("/api/notifications")
-async def get_notifications(user_email: str):
-    notifs = await notifications_col.find({"user_email": user_email}, {"_id": 0}).sort("created_date", -1).to_list(100)
-    return notifs
+async def get_notifications(user_email: str = Depends(current_user_email), page: Page = Depends(page_params())):
+    return await paginate(notifications_col, {"user_email": user_email}, page)
 
 @app.post("/api/notifications")
 async def create_notification(notif_data: dict):
     notif_data["id"] = str(uuid.uuid4())
     notif_data["created_date"] = datetime.now(timezone.utc).isoformat()
     notif_data["read"] = False
-    await notifications_col.insert_one(notif_data)
-    return {k: v for k, v in notif_data.items() if k != "_id"}
+    response = await insert_doc(notifications_col, notif_data)
+    if notif_data.get("user_email"):
+        await bump_unread(notif_data["user_email"], "notifications")
+        invalidation_bus.publish("notifications", "insert", notif_data)
+    return response
+
+@app.post("/api/notifications:batch")
+async def create_notifications_batch(notifications: List[dict] = Body(...)):
+    check_batch_size(notifications)
+    results = [None] * len(notifications)
+    docs = []
+    for index, notif_data in enumerate(notifications):
+        notif_data["id"] = str(uuid.uuid4())
+        notif_data["created_date"] = datetime.now(timezone.utc).isoformat()
+        notif_data["read"] = False
+        docs.append((index, notif_data))
+    inserted = [n for n in await insert_batch(notifications_col, docs, results) if n.get("user_email")]
+    await bump_unread_many([n["user_email"] for n in inserted], "notifications")
+    for notif_data in inserted:
+        invalidation_bus.publish("notifications", "insert", notif_data)
+    return batch_summary(results)
+
+@app.put("/api/notifications/read-all")
+async def mark_all_read(user_email: str = Depends(current_user_email)):
+    result = await notifications_col.update_many({"user_email": user_email, "read": False}, {"$set": {"read": True}})
+    await bump_unread(user_email, "notifications", -result.modified_count)
+    return {"message": "Marked read", "updated": result.modified_count}
 
 @app.put("/api/notifications/{notif_id}/read")
 async def mark_read(notif_id: str):
-    await notifications_col.update_one({"id": notif_id}, {"$set": {"read": True}})
+    # Only the request that flips read=False -> True decrements the counter
+    notif = await notifications_col.find_one_and_update(
+        {"id": notif_id, "read": False}, {"$set": {"read": True}}, projection={"_id": 0, "user_email": 1}
+    )
+    if notif and notif.get("user_email"):
+        await bump_unread(notif["user_email"], "notifications", -1)
     return {"message": "Marked read"}
 
+# ==================== UNREAD COUNTERS ====================
+# One small document per user, kept in step with inserts and read flips via
+# $inc so badges never count lists. `python migrations.py unread_counters`
+# recomputes them from the source collections if they drift.
+UNREAD_FIELDS = ("notifications", "messages")
+
+async def bump_unread(user_email: str, field: str, amount: int = 1):
+    if amount:
+        await unread_col.update_one({"user_email": user_email}, {"$inc": {field: amount}}, upsert=True)
+
+async def bump_unread_many(user_emails: List[str], field: str):
+    counts = {}
+    for email in user_emails:
+        counts[email] = counts.get(email, 0) + 1
+    if counts:
+        await unread_col.bulk_write(
+            [UpdateOne({"user_email": email}, {"$inc": {field: n}}, upsert=True) for email, n in counts.items()],
+            ordered=False,
+        )
+
+@app.get("/api/unread")
+async def get_unread(user_email: str = Depends(current_user_email)):
+    doc = await unread_col.find_one({"user_email": user_email}, {"_id": 0}) or {}
+    return FastJSONResponse({field: max(doc.get(field, 0), 0) for field in UNREAD_FIELDS})
+
 # ==================== CRYPTO ====================
 @app.get("/api/crypto/wallets")
-async def get_wallets(user_email: str):
-    wallets = await wallets_col.find({"user_email": user_email}, {"_id": 0}).to_list(100)
-    return wallets
+async def get_wallets(user_email: str = Depends(current_user_email), page: Page = Depends(page_params())):
+    return await paginate(wallets_col, {"user_email": user_email}, page)
 
 @app.post("/api/crypto/wallets")
 async def create_wallet(wallet_data: dict):
     wallet_data["id"] = str(uuid.uuid4())
     wallet_data["created_date"] = datetime.now(timezone.utc).isoformat()
-    await wallets_col.insert_one(wallet_data)
-    return {k: v for k, v in wallet_data.items() if k != "_id"}
+    return await insert_doc(wallets_col, wallet_data)
 
 @app.get("/api/crypto/transactions")
-async def get_transactions(user_email: str):
-    txs = await transactions_col.find({"user_email": user_email}, {"_id": 0}).sort("created_date", -1).to_list(100)
-    return txs
+async def get_transactions(user_email: str = Depends(current_user_email), page: Page = Depends(page_params())):
+    return await paginate(transactions_col, {"user_email": user_email}, page)
 
 @app.post("/api/crypto/transactions")
 async def create_transaction(tx_data: dict):
     tx_data["id"] = str(uuid.uuid4())
     tx_data["created_date"] = datetime.now(timezone.utc).isoformat()
-    await transactions_col.insert_one(tx_data)
-    return {k: v for k, v in tx_data.items() if k != "_id"}
+    return await insert_doc(transactions_col, tx_data)
 
 # ==================== MESSAGING ====================
+MESSAGE_FIELDS = {
+    "id", "sender_email", "sender_name", "receiver_email", "conversation_key", "message", "read", "created_date",
+}
+
 @app.get("/api/messages")
-async def get_messages(user_email: str, other_email: str):
-    messages = await messages_col.find({
-        "$or": [
-            {"sender_email": user_email, "receiver_email": other_email},
-            {"sender_email": other_email, "receiver_email": user_email}
-        ]
-    }, {"_id": 0}).sort("created_date", 1).to_list(1000)
-    return messages
+async def get_messages(
+    other_email: str,
+    user_email: str = Depends(current_user_email),
+    page: Page = Depends(page_params()),
+    projection: Optional[dict] = Depends(fields_param(MESSAGE_FIELDS)),
+):
+    # Newest page first; X-Next-Cursor loads the page of older messages
+    query = {"conversation_key": conversation_key(user_email, other_email)}
+    return await paginate(messages_col, query, page, projection, direction=DESCENDING, reverse=True)
 
 @app.post("/api/messages")
-async def send_message(msg: MessageCreate, user_email: str):
-    user = await users_col.find_one({"email": user_email}, {"_id": 0})
+async def send_message(msg: MessageCreate, user_email: str = Depends(current_user_email)):
+    user = await get_user_profile(user_email)
     doc = {
         "id": str(uuid.uuid4()),
         "sender_email": user_email,
         "sender_name": user.get("full_name", user_email) if user else user_email,
         "receiver_email": msg.receiver_email,
+        "conversation_key": conversation_key(user_email, msg.receiver_email),
         "message": msg.message,
         "read": False,
         "created_date": datetime.now(timezone.utc).isoformat()
     }
-    await messages_col.insert_one(doc)
-    return {k: v for k, v in doc.items() if k != "_id"}
+    response = await insert_doc(messages_col, doc)
+    await bump_unread(msg.receiver_email, "messages")
+    invalidation_bus.publish("chat_messages", "insert", doc)
+    return response
+
+@app.put("/api/messages/read")
+async def mark_messages_read(other_email: str, user_email: str = Depends(current_user_email)):
+    """Mark everything other_email sent to user_email as read."""
+    result = await messages_col.update_many(
+        {"conversation_key": conversation_key(user_email, other_email), "receiver_email": user_email, "read": False},
+        {"$set": {"read": True}},
+    )
+    await bump_unread(user_email, "messages", -result.modified_count)
+    return {"message": "Marked read", "updated": result.modified_count}
+
+# ==================== PUSH (SSE) ====================
+# Clients subscribe once instead of polling notifications/messages. Event ids
+# are the document created_date, so a reconnect with Last-Event-ID replays
+# everything newer from Mongo before switching to live events.
+# New documents reach the hub through the invalidation bus, whose change
+# stream (inserts only) carries them to the worker holding the client's
+# connection. Without change streams delivery stays within the writing
+# worker and other clients catch up on their next reconnect.
+push_hub = PushHub(queue_size=int(os.environ.get("PUSH_QUEUE_SIZE", "256")))
+
+def push_on_insert(event: str, recipient_field: str):
+    def on_change(operation: str, doc: Optional[dict]):
+        if operation != "insert" or not doc or not doc.get(recipient_field):
+            return
+        data = {k: v for k, v in doc.items() if k != "_id"}
+        push_hub.publish(data[recipient_field], event, data["created_date"], data)
+    return on_change
+
+invalidation_bus.subscribe("notifications", push_on_insert("notification", "user_email"), operations=("insert",))
+invalidation_bus.subscribe("chat_messages", push_on_insert("message", "receiver_email"), operations=("insert",))
+PUSH_KEEPALIVE_SECONDS = float(os.environ.get("PUSH_KEEPALIVE_SECONDS", "15"))
+PUSH_REPLAY_LIMIT = int(os.environ.get("PUSH_REPLAY_LIMIT", "500"))
+
+async def replay_events(user_email: str, last_event_id: str) -> list:
+    notifs = await notifications_col.find(
+        {"user_email": user_email, "created_date": {"$gt": last_event_id}}, {"_id": 0}
+    ).sort(sort_spec("created_date", ASCENDING)).limit(PUSH_REPLAY_LIMIT).to_list(PUSH_REPLAY_LIMIT)
+    messages = await messages_col.find(
+        {"receiver_email": user_email, "created_date": {"$gt": last_event_id}}, {"_id": 0}
+    ).sort(sort_spec("created_date", ASCENDING)).limit(PUSH_REPLAY_LIMIT).to_list(PUSH_REPLAY_LIMIT)
+    events = [{"id": d["created_date"], "event": "notification", "data": d} for d in notifs]
+    events += [{"id": d["created_date"], "event": "message", "data": d} for d in messages]
+    events.sort(key=lambda e: e["id"])
+    return events[:PUSH_REPLAY_LIMIT]
+
+@app.get("/api/events")
+async def stream_events(request: Request, user_email: str = Depends(current_user_email), last_event_id: Optional[str] = None):
+    resume_from = last_event_id or request.headers.get("last-event-id")
+
+    async def event_stream():
+        async with push_hub.subscribe(user_email) as queue:
+            last_sent = resume_from or ""
+            if resume_from:
+                for event in await replay_events(user_email, resume_from):
+                    last_sent = event["id"]
+                    yield format_sse(event)
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=PUSH_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield b": keepalive\n\n"
+                    continue
+                # Already delivered by the replay above
+                if event["id"] <= last_sent:
+                    continue
+                yield format_sse(event)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 # ==================== PRESENCE ====================
+# Heartbeats land in memory and are flushed to presence_col in batches.
+# Other workers' flushes are picked up by reloading every
+# PRESENCE_REFRESH_EVERY flush cycles rather than through the invalidation
+# change stream, where each flushed upsert would cost every worker a
+# post-image lookup.
+presence_store = PresenceStore(
+    presence_col,
+    flush_interval=float(os.environ.get("PRESENCE_FLUSH_INTERVAL", "2")),
+    offline_after=float(os.environ.get("PRESENCE_OFFLINE_AFTER", "90")),
+    refresh_every=int(os.environ.get("PRESENCE_REFRESH_EVERY", "15")),
+)
+
+@app.on_event("startup")
+async def start_presence_store():
+    await presence_store.load()
+    presence_store.start()
+
+@app.on_event("shutdown")
+async def stop_presence_store():
+    await presence_store.stop()
+
 @app.get("/api/presence")
-async def get_presence():
-    presences = await presence_col.find({}, {"_id": 0}).to_list(1000)
-    return presences
+async def get_presence(request: Request, page: Page = Depends(page_params())):
+    fmt = stream_format(request)
+    if fmt:
+        return stream_items(presence_store.snapshot(), fmt)
+    try:
+        items, next_cursor = page_list(
+            presence_store.snapshot(), sort_field="user_email", cursor=page.cursor, limit=page.limit
+        )
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+    return FastJSONResponse(items, headers=headers)
 
 @app.post("/api/presence")
-async def update_presence(user_email: str, status: str = "online"):
-    user = await users_col.find_one({"email": user_email}, {"_id": 0})
-    existing = await presence_col.find_one({"user_email": user_email})
-    
-    doc = {
-        "user_email": user_email,
-        "user_name": user.get("full_name", user_email) if user else user_email,
-        "status": status,
-        "last_seen": datetime.now(timezone.utc).isoformat()
-    }
-    
-    if existing:
-        await presence_col.update_one({"user_email": user_email}, {"$set": doc})
-    else:
-        doc["id"] = str(uuid.uuid4())
-        await presence_col.insert_one(doc)
-    
+async def update_presence(user_email: str = Depends(current_user_email), status: str = "online"):
+    user = await get_user_profile(user_email)
+    user_name = user.get("full_name", user_email) if user else user_email
+    presence_store.heartbeat(user_email, user_name, status)
     return {"message": "Presence updated"}
 
 # ==================== SUPPORT ====================
 @app.get("/api/support/tickets")
-async def get_tickets(user_email: Optional[str] = None):
+async def get_tickets(user_email: Optional[str] = None, page: Page = Depends(page_params())):
     query = {"user_email": user_email} if user_email else {}
-    tickets = await tickets_col.find(query, {"_id": 0}).sort("created_date", -1).to_list(100)
-    return tickets
+    return await paginate(tickets_col, query, page)
 
 @app.post("/api/support/tickets")
 async def create_ticket(ticket_data: dict):
@@ -437,52 +1432,47 @@ async def create_ticket(ticket_data: dict):
     ticket_data["ticket_id"] = f"TKT-{uuid.uuid4().hex[:8].upper()}"
     ticket_data["status"] = "open"
     ticket_data["created_date"] = datetime.now(timezone.utc).isoformat()
-    await tickets_col.insert_one(ticket_data)
-    return {k: v for k, v in ticket_data.items() if k != "_id"}
+    return await insert_doc(tickets_col, ticket_data)
 
 @app.get("/api/support/interactions")
-async def get_interactions(user_email: Optional[str] = None):
+async def get_interactions(user_email: Optional[str] = None, page: Page = Depends(page_params())):
     query = {"user_email": user_email} if user_email else {}
-    interactions = await interactions_col.find(query, {"_id": 0}).sort("created_date", -1).to_list(100)
-    return interactions
+    return await paginate(interactions_col, query, page)
 
 # ==================== WORKSPACES ====================
 @app.get("/api/workspaces")
-async def get_workspaces(user_email: str):
-    workspaces = await workspaces_col.find({
+async def get_workspaces(user_email: str = Depends(current_user_email), page: Page = Depends(page_params())):
+    query = {
         "$or": [
             {"owner_email": user_email},
             {"members.email": user_email}
         ]
-    }, {"_id": 0}).to_list(100)
-    return workspaces
+    }
+    return await paginate(workspaces_col, query, page)
 
 @app.post("/api/workspaces")
 async def create_workspace(ws_data: dict):
     ws_data["id"] = str(uuid.uuid4())
     ws_data["created_date"] = datetime.now(timezone.utc).isoformat()
-    await workspaces_col.insert_one(ws_data)
-    return {k: v for k, v in ws_data.items() if k != "_id"}
+    return await insert_doc(workspaces_col, ws_data)
 
 # ==================== COLLABORATION SESSIONS ====================
 @app.get("/api/collaboration/sessions")
-async def get_sessions(user_email: Optional[str] = None):
+async def get_sessions(user_email: Optional[str] = None, page: Page = Depends(page_params())):
     query = {}
     if user_email:
         query["$or"] = [
             {"owner_email": user_email},
             {"participants.email": user_email}
         ]
-    sessions = await sessions_col.find(query, {"_id": 0}).sort("last_active", -1).to_list(100)
-    return sessions
+    return await paginate(sessions_col, query, page, sort_field="last_active")
 
 @app.post("/api/collaboration/sessions")
 async def create_session(session_data: dict):
     session_data["id"] = str(uuid.uuid4())
     session_data["created_date"] = datetime.now(timezone.utc).isoformat()
     session_data["last_active"] = datetime.now(timezone.utc).isoformat()
-    await sessions_col.insert_one(session_data)
-    return {k: v for k, v in session_data.items() if k != "_id"}
+    return await insert_doc(sessions_col, session_data)
 
 @app.put("/api/collaboration/sessions/{session_id}")
 async def update_session(session_id: str, data: dict):
@@ -493,10 +1483,20 @@ async def update_session(session_id: str, data: dict):
     return {"message": "Updated"}
 
 # ==================== USERS LIST (for chat) ====================
+# never includes hashed_password
+USER_FIELDS = {"id", "email", "full_name", "role", "is_active", "created_at"}
+
 @app.get("/api/users")
-async def get_users():
-    users = await users_col.find({}, {"_id": 0, "hashed_password": 0}).to_list(1000)
-    return users
+async def get_users(
+    request: Request,
+    page: Page = Depends(page_params()),
+    fields: Optional[dict] = Depends(fields_param(USER_FIELDS, "created_at")),
+):
+    projection = fields or {"_id": 0, "hashed_password": 0}
+    fmt = stream_format(request)
+    if fmt:
+        return stream_documents(users_col.find({}, projection).sort(sort_spec("created_at")), fmt)
+    return await paginate(users_col, {}, page, projection=projection, sort_field="created_at")
 
 # ==================== CALL HISTORY (for Supabase Edge Function) ====================
 # Additional MongoDB collections for hybrid architecture
@@ -504,6 +1504,7 @@ projects_col = db.projects
 messages_archive_col = db.messages_archive
 call_history_col = db.call_history
 creator_assets_col = db.creator_assets
+call_rollups_col = db.call_rollups
 
 class CallHistoryCreate(BaseModel):
     callId: str
@@ -514,14 +1515,12 @@ class CallHistoryCreate(BaseModel):
     endedAt: str
     metadata: Optional[dict] = None
 
-@app.post("/api/call-history")
-async def log_call_history(call: CallHistoryCreate):
-    """Endpoint for Supabase Edge Function to log calls to MongoDB"""
+def build_call_history_doc(call: CallHistoryCreate) -> dict:
     started = datetime.fromisoformat(call.startedAt.replace('Z', '+00:00'))
     ended = datetime.fromisoformat(call.endedAt.replace('Z', '+00:00'))
     duration_seconds = (ended - started).total_seconds()
 
-    doc = {
+    return {
         "id": str(uuid.uuid4()),
         "callId": call.callId,
         "callerId": call.callerId,
@@ -534,17 +1533,454 @@ async def log_call_history(call: CallHistoryCreate):
         "createdAt": datetime.now(timezone.utc).isoformat()
     }
 
+# Per-participant, per-UTC-day rollups of call_history ("*" is every user),
+# bumped with $inc as calls are logged so analytics read one document per day.
+# `python migrations.py call_rollups` rebuilds them from scratch.
+ALL_USERS = "*"
+MAX_ANALYTICS_DAYS = 731
+
+def call_rollup_ops(docs: List[dict]) -> List[UpdateOne]:
+    totals = {}
+    for doc in docs:
+        day = datetime.fromisoformat(doc["startedAt"]).astimezone(timezone.utc).date().isoformat()
+        for user_id in {doc.get("callerId"), doc.get("calleeId"), ALL_USERS} - {None}:
+            bucket = totals.setdefault((user_id, day), {"calls": 0, "duration_seconds": 0.0})
+            bucket["calls"] += 1
+            bucket["duration_seconds"] += doc["durationSeconds"]
+            status_field = "statuses." + rollup_status(doc["status"])
+            bucket[status_field] = bucket.get(status_field, 0) + 1
+    return [UpdateOne({"user_id": user_id, "day": day}, {"$inc": inc}, upsert=True)
+            for (user_id, day), inc in totals.items()]
+
+async def update_call_rollups(docs: List[dict]):
+    ops = call_rollup_ops(docs)
+    if ops:
+        await call_rollups_col.bulk_write(ops, ordered=False)
+
+@app.post("/api/call-history")
+async def log_call_history(call: CallHistoryCreate):
+    """Endpoint for Supabase Edge Function to log calls to MongoDB"""
+    doc = build_call_history_doc(call)
     await call_history_col.insert_one(doc)
+    await update_call_rollups([doc])
     return {"ok": True, "id": doc["id"]}
 
+@app.post("/api/call-history:batch")
+async def log_call_history_batch(calls: List[dict] = Body(...)):
+    """Batch variant for the Edge Function and backfill jobs"""
+    check_batch_size(calls)
+    results = [None] * len(calls)
+    docs = []
+    for index, item in enumerate(calls):
+        try:
+            docs.append((index, build_call_history_doc(CallHistoryCreate.model_validate(item))))
+        except ValidationError as e:
+            results[index] = validation_error(e)
+        except ValueError as e:
+            results[index] = {"ok": False, "error": str(e)}
+    await update_call_rollups(await insert_batch(call_history_col, docs, results))
+    return batch_summary(results)
+
+@app.get("/api/call-history/analytics")
+async def get_call_analytics(start: date, end: date, user_id: Optional[str] = None):
+    if end < start:
+        raise HTTPException(status_code=400, detail="end must not be before start")
+    if (end - start).days >= MAX_ANALYTICS_DAYS:
+        raise HTTPException(status_code=400, detail=f"Range exceeds {MAX_ANALYTICS_DAYS} days")
+    rollups = await call_rollups_col.find(
+        {"user_id": user_id or ALL_USERS, "day": {"$gte": start.isoformat(), "$lte": end.isoformat()}},
+        {"_id": 0, "user_id": 0},
+    ).sort("day", ASCENDING).to_list(MAX_ANALYTICS_DAYS)
+
+    totals = {"calls": 0, "duration_seconds": 0.0, "statuses": {}}
+    for day in rollups:
+        day.setdefault("statuses", {})
+        day["avg_duration_seconds"] = day["duration_seconds"] / day["calls"] if day.get("calls") else 0.0
+        totals["calls"] += day.get("calls", 0)
+        totals["duration_seconds"] += day.get("duration_seconds", 0.0)
+        for status_name, count in day["statuses"].items():
+            totals["statuses"][status_name] = totals["statuses"].get(status_name, 0) + count
+    totals["avg_duration_seconds"] = totals["duration_seconds"] / totals["calls"] if totals["calls"] else 0.0
+    return FastJSONResponse({"user_id": user_id, "days": rollups, "totals": totals})
+
+CALL_HISTORY_FIELDS = set(CallHistoryCreate.model_fields) | {"id", "durationSeconds", "createdAt"}
+
 @app.get("/api/call-history")
-async def get_call_history(user_id: Optional[str] = None, limit: int = 50):
+async def get_call_history(
+    user_id: Optional[str] = None,
+    page: Page = Depends(page_params(50)),
+    projection: Optional[dict] = Depends(fields_param(CALL_HISTORY_FIELDS, "createdAt")),
+):
     query = {}
     if user_id:
         query["$or"] = [{"callerId": user_id}, {"calleeId": user_id}]
     
-    calls = await call_history_col.find(query, {"_id": 0}).sort("createdAt", -1).limit(limit).to_list(limit)
-    return calls
+    return await paginate(call_history_col, query, page, projection, sort_field="createdAt")
+
+# ==================== PARTIAL UPDATES ====================
+# Editors autosave deltas instead of whole documents. Ops use JSON Patch
+# pointers ("/data/layers/0/name") or dotted paths ("data.layers.0.name"):
+# replace/add become $set (add to "/-" appends with $push) and remove
+# becomes $unset. $set/$unset can't shift array elements, so add and remove
+# at an array index are rejected; replace the whole array instead. Ops on a
+# payload spilled to blob storage are applied server-side (see LARGE
+# PAYLOADS). The client sends the version it last saw; a stale version gets
+# 409 and must reload before retrying.
+class PatchOp(BaseModel):
+    op: Literal["add", "replace", "remove"]
+    path: str
+    value: Any = None
+
+class PatchRequest(BaseModel):
+    version: int = Field(..., ge=0)
+    ops: List[PatchOp] = Field(..., min_length=1, max_length=1000)
+
+def patch_path(path: str, roots: set) -> List[str]:
+    if path.startswith("/"):
+        segments = [p.replace("~1", "/").replace("~0", "~") for p in path[1:].split("/")]
+        if any("." in p for p in segments):
+            raise HTTPException(status_code=400, detail=f"Path segment contains '.': {path}")
+    else:
+        segments = path.split(".")
+    if not segments or any(not p or p.startswith("$") for p in segments):
+        raise HTTPException(status_code=400, detail=f"Invalid path: {path}")
+    if segments[0] not in roots:
+        raise HTTPException(status_code=400, detail=f"Path must start with one of: {', '.join(sorted(roots))}")
+    return segments
+
+def patch_update(ops: List[PatchOp], roots: set) -> dict:
+    sets, unsets, pushes = {}, {}, {}
+    for op in ops:
+        segments = patch_path(op.path, roots)
+        if op.op in ("add", "remove") and len(segments) > 1 and segments[-1].isdigit():
+            raise HTTPException(
+                status_code=400,
+                detail=f"{op.op} at an array index is not supported, replace the array instead: {op.path}",
+            )
+        if op.op == "add" and segments[-1] == "-":
+            field = ".".join(segments[:-1])
+            pushes.setdefault(field, []).append(op.value)
+        elif op.op == "remove":
+            unsets[".".join(segments)] = ""
+        else:
+            sets[".".join(segments)] = op.value
+
+    # Mongo rejects one update touching a path and its parent or child
+    paths = sorted(list(sets) + list(unsets) + list(pushes))
+    for a, b in zip(paths, paths[1:]):
+        if a == b or b.startswith(a + "."):
+            raise HTTPException(status_code=400, detail=f"Conflicting paths: {a}, {b}")
+
+    update = {"$set": {**sets, "updatedAt": datetime.now(timezone.utc).isoformat()}, "$inc": {"version": 1}}
+    if unsets:
+        update["$unset"] = unsets
+    if pushes:
+        update["$push"] = {field: {"$each": values} for field, values in pushes.items()}
+    return update
+
+def version_filter(doc_id: str, version: int) -> dict:
+    # documents written before versioning count as version 0
+    return {"id": doc_id, "version": version if version else {"$in": [0, None]}}
+
+async def patch_conflict(collection, doc_id: str, name: str):
+    current = await collection.find_one({"id": doc_id}, {"_id": 0, "version": 1})
+    if current is None:
+        raise HTTPException(status_code=404, detail=f"{name} not found")
+    raise HTTPException(
+        status_code=409,
+        detail={"message": "Version conflict", "version": current.get("version", 0)},
+    )
+
+async def apply_patch(collection, doc_id: str, patch: PatchRequest, roots: set, name: str) -> dict:
+    update = patch_update(patch.ops, roots)
+    query = version_filter(doc_id, patch.version)
+    if any(patch_path(op.path, roots)[0] == "data" for op in patch.ops):
+        current = await collection.find_one(query, {"_id": 0, "data_ref": 1})
+        if current and current.get("data_ref"):
+            return await patch_spilled_payload(collection, doc_id, patch, roots, current["data_ref"], name)
+        query["data_ref"] = None
+    try:
+        before = await collection.find_one_and_update(query, update, projection={"_id": 0, "version": 1})
+    except OperationFailure as e:
+        # e.g. $push onto a field that isn't an array
+        raise HTTPException(status_code=400, detail=(e.details or {}).get("errmsg", str(e)))
+    if before is None:
+        await patch_conflict(collection, doc_id, name)
+    return {"message": "Updated", "version": (before.get("version") or 0) + 1}
+
+# ==================== LARGE PAYLOADS ====================
+# Project and creator asset "data" above PAYLOAD_SPILL_BYTES (as JSON) is
+# written to a content-addressed blob store and the document keeps a
+# "data_ref" ({store, sha256, size, content_type}) with "data": null, so
+# list queries and the working set stay small. GET .../data streams the
+# payload either way, with single-range support; PUT .../data takes a
+# streamed body so large uploads are never held in memory whole (they are
+# validated incrementally, see jsonstream.py).
+PAYLOAD_STORE = os.environ.get("PAYLOAD_STORE", "gridfs")
+PAYLOAD_SPILL_BYTES = int(os.environ.get("PAYLOAD_SPILL_BYTES", str(256 * 1024)))
+MAX_PAYLOAD_BYTES = int(os.environ.get("MAX_PAYLOAD_BYTES", str(256 * 1024 * 1024)))
+# PATCH on a spilled payload rewrites it whole; above this, clients PUT it instead
+MAX_PATCH_PAYLOAD_BYTES = int(os.environ.get("MAX_PATCH_PAYLOAD_BYTES", str(16 * 1024 * 1024)))
+
+if PAYLOAD_STORE == "local":
+    payload_store = LocalBlobStore(os.environ.get("PAYLOAD_DIR", "payloads"))
+else:
+    payload_store = GridFSBlobStore(db)
+
+async def payload_referenced(sha256: str) -> bool:
+    for collection in (projects_col, creator_assets_col):
+        if await collection.find_one({"data_ref.sha256": sha256}, {"_id": 1}):
+            return True
+    return False
+
+# Replaced and deleted payloads are released right away; blobs touched in
+# the last PAYLOAD_GC_GRACE seconds are left to the periodic sweep.
+payload_collector = BlobCollector(
+    payload_store,
+    payload_referenced,
+    grace=float(os.environ.get("PAYLOAD_GC_GRACE", "600")),
+    interval=float(os.environ.get("PAYLOAD_GC_INTERVAL", "3600")),
+)
+
+@app.on_event("startup")
+async def start_payload_collector():
+    payload_collector.start()
+
+@app.on_event("shutdown")
+async def stop_payload_collector():
+    await payload_collector.stop()
+
+async def replace_payload(collection, query: dict, update: dict, name: str) -> dict:
+    """Run an update that may swap the document's data, then release the
+    blob it used to point at. Returns the pre-update version."""
+    before = await collection.find_one_and_update(query, update, projection={"_id": 0, "version": 1, "data_ref": 1})
+    if before is None:
+        await patch_conflict(collection, query["id"], name)
+    old_ref, new_ref = before.get("data_ref"), update["$set"].get("data_ref")
+    if old_ref and (not new_ref or new_ref["sha256"] != old_ref["sha256"]):
+        await payload_collector.release(old_ref)
+    return before
+
+async def delete_with_payload(collection, doc_id: str, name: str) -> dict:
+    doc = await collection.find_one_and_delete({"id": doc_id}, projection={"_id": 0, "data_ref": 1})
+    if doc is None:
+        raise HTTPException(status_code=404, detail=f"{name} not found")
+    await payload_collector.release(doc.get("data_ref"))
+    return {"message": "Deleted"}
+
+async def spill_payload(data: Optional[dict]) -> dict:
+    """Fields to $set for a new data payload: inline when small, else a blob reference."""
+    return await store_payload(data, dumps(data))
+
+async def store_payload(data: Optional[dict], encoded: bytes) -> dict:
+    if len(encoded) <= PAYLOAD_SPILL_BYTES:
+        return {"data": data, "data_ref": None}
+    return {"data": None, "data_ref": await payload_store.put(encoded)}
+
+async def read_payload(ref: dict) -> bytearray:
+    try:
+        if ref["store"] != payload_store.name:
+            raise BlobNotFound(ref["sha256"])
+        chunks = await payload_store.open(ref["sha256"])
+    except BlobNotFound:
+        raise HTTPException(status_code=404, detail="Payload not found")
+    body = bytearray()
+    async for chunk in chunks:
+        body += chunk
+    return body
+
+def parse_payload(body: bytearray) -> Any:
+    try:
+        return orjson.loads(body)
+    except orjson.JSONDecodeError:
+        # stored before uploads were checked as strictly as orjson parses
+        raise HTTPException(status_code=409, detail="Stored payload is not valid JSON, replace it with PUT .../data")
+
+def payload_child(node: Any, segment: str, create: bool, path: str) -> Any:
+    if isinstance(node, dict):
+        if segment not in node:
+            if not create:
+                return None
+            node[segment] = {}
+        return node[segment]
+    if isinstance(node, list) and segment.isdigit() and int(segment) < len(node):
+        return node[int(segment)]
+    if create:
+        raise HTTPException(status_code=400, detail=f"Cannot create {path}")
+    return None
+
+def patch_payload(data: Any, ops: List[PatchOp]) -> Any:
+    """Apply PATCH ops to a payload held in memory, with the results $set,
+    $unset and $push give for an inline one."""
+    root = {"data": data}
+    for op in ops:
+        segments = patch_path(op.path, {"data"})
+        push = op.op == "add" and segments[-1] == "-"
+        if push:
+            segments = segments[:-1]
+        node = root
+        for segment in segments[:-1]:
+            node = payload_child(node, segment, op.op != "remove", op.path)
+            if node is None:
+                break
+        key = segments[-1]
+        if op.op == "remove":
+            if isinstance(node, dict):
+                node.pop(key, None)
+        elif push:
+            if isinstance(node, dict) and key not in node:
+                node[key] = []
+            target = payload_child(node, key, False, op.path)
+            if not isinstance(target, list):
+                raise HTTPException(status_code=400, detail=f"Cannot append to a non-array: {op.path}")
+            target.append(op.value)
+        elif isinstance(node, dict):
+            node[key] = op.value
+        elif isinstance(node, list) and key.isdigit() and int(key) < len(node):
+            node[int(key)] = op.value
+        else:
+            raise HTTPException(status_code=400, detail=f"Cannot create {op.path}")
+    return root.get("data")
+
+async def patch_spilled_payload(collection, doc_id: str, patch: PatchRequest, roots: set,
+                                ref: dict, name: str) -> dict:
+    """PATCH for a document whose data is in the blob store. The data ops are
+    applied to the loaded payload, which is spilled again (or moved back
+    inline if it shrank); the other ops go through patch_update as usual.
+    The client still only sends the delta. Parsing, patching and encoding
+    run in a worker thread, and payloads above MAX_PATCH_PAYLOAD_BYTES are
+    refused rather than rewritten."""
+    if ref["size"] > MAX_PATCH_PAYLOAD_BYTES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Payload exceeds {MAX_PATCH_PAYLOAD_BYTES} bytes and can't be patched, replace it with PUT .../data",
+        )
+    is_data = [patch_path(op.path, roots)[0] == "data" for op in patch.ops]
+    data_ops = [op for op, d in zip(patch.ops, is_data) if d]
+    update = patch_update([op for op, d in zip(patch.ops, is_data) if not d], roots)
+    body = await read_payload(ref)
+
+    def rebuild() -> tuple:
+        data = patch_payload(parse_payload(body), data_ops)
+        return data, dumps(data)
+    data, encoded = await asyncio.to_thread(rebuild)
+    update["$set"].update(await store_payload(data, encoded))
+    query = {**version_filter(doc_id, patch.version), "data_ref.sha256": ref["sha256"]}
+    before = await replace_payload(collection, query, update, name)
+    return {"message": "Updated", "version": (before.get("version") or 0) + 1}
+
+def range_not_satisfiable(size: int) -> HTTPException:
+    return HTTPException(status_code=416, detail="Range not satisfiable",
+                         headers={"Content-Range": f"bytes */{size}"})
+
+def byte_range(header: Optional[str], size: int) -> Optional[tuple]:
+    """Parse a single "bytes=a-b", "bytes=a-" or "bytes=-n" range into an
+    inclusive (start, end); None means the whole payload."""
+    if not header:
+        return None
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        raise range_not_satisfiable(size)
+    first, _, last = spec.strip().partition("-")
+    try:
+        if not first:
+            suffix = int(last)
+            if suffix <= 0:
+                raise ValueError
+            start, end = max(size - suffix, 0), size - 1
+        else:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+    except ValueError:
+        raise range_not_satisfiable(size)
+    if start < 0 or start > end:
+        raise range_not_satisfiable(size)
+    return start, end
+
+async def download_payload(collection, doc_id: str, range_header: Optional[str], name: str):
+    doc = await collection.find_one({"id": doc_id}, {"_id": 0, "data": 1, "data_ref": 1})
+    if doc is None:
+        raise HTTPException(status_code=404, detail=f"{name} not found")
+    ref = doc.get("data_ref")
+    if ref:
+        size, media_type = ref["size"], ref["content_type"]
+        headers = {"Accept-Ranges": "bytes", "ETag": f'"{ref["sha256"]}"'}
+    else:
+        body = dumps(doc.get("data") or {})
+        size, media_type = len(body), "application/json"
+        headers = {"Accept-Ranges": "bytes"}
+
+    requested = byte_range(range_header, size)
+    start, end = requested or (0, size - 1)
+    status_code = 200
+    if requested:
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    if not ref:
+        return Response(body[start:end + 1], status_code=status_code, media_type=media_type, headers=headers)
+
+    try:
+        # blobs written under another PAYLOAD_STORE aren't reachable from here
+        if ref["store"] != payload_store.name:
+            raise BlobNotFound(ref["sha256"])
+        chunks = await payload_store.open(ref["sha256"], start, end)
+    except BlobNotFound:
+        raise HTTPException(status_code=404, detail="Payload not found")
+    headers["Content-Length"] = str(end + 1 - start)
+    return StreamingResponse(chunks, status_code=status_code, media_type=media_type, headers=headers)
+
+async def upload_payload(collection, doc_id: str, request: Request, version: Optional[int], name: str) -> dict:
+    """Replace a document's data from a streamed JSON body. Bodies up to the
+    spill threshold are parsed and stored inline; larger ones are validated
+    chunk by chunk on their way to the blob store, and the stored blob is
+    discarded if the body turns out not to be a JSON object."""
+    media_type = request.headers.get("content-type", "application/json").split(";")[0].strip()
+    if media_type != "application/json":
+        raise HTTPException(status_code=415, detail="Payload must be application/json")
+    if not await collection.find_one({"id": doc_id}, {"_id": 1}):
+        raise HTTPException(status_code=404, detail=f"{name} not found")
+
+    chunks = request.stream().__aiter__()
+    head = bytearray()
+    async for chunk in chunks:
+        head += chunk
+        if len(head) > PAYLOAD_SPILL_BYTES:
+            break
+    if len(head) <= PAYLOAD_SPILL_BYTES:
+        try:
+            data = orjson.loads(head)
+        except orjson.JSONDecodeError:
+            raise HTTPException(status_code=400, detail="Payload is not valid JSON")
+        if not isinstance(data, dict):
+            raise HTTPException(status_code=400, detail="Payload must be a JSON object")
+        fields = {"data": data, "data_ref": None}
+    else:
+        validator = JSONObjectValidator()
+
+        async def body():
+            first = bytes(head)
+            await asyncio.to_thread(validator.feed, first)
+            yield first
+            async for chunk in chunks:
+                await asyncio.to_thread(validator.feed, chunk)
+                yield chunk
+            validator.close()
+        try:
+            ref = await payload_store.put_stream(body(), media_type, MAX_PAYLOAD_BYTES)
+        except BlobTooLarge:
+            raise HTTPException(status_code=413, detail=f"Payload exceeds {MAX_PAYLOAD_BYTES} bytes")
+        except InvalidJSON as e:
+            raise HTTPException(status_code=400, detail=f"Payload is not a valid JSON object: {e}")
+        fields = {"data": None, "data_ref": ref}
+
+    query = {"id": doc_id} if version is None else version_filter(doc_id, version)
+    before = await replace_payload(
+        collection,
+        query,
+        {"$set": {**fields, "updatedAt": datetime.now(timezone.utc).isoformat()}, "$inc": {"version": 1}},
+        name,
+    )
+    return {"message": "Updated", "version": (before.get("version") or 0) + 1, "data_ref": fields["data_ref"]}
 
 # ==================== PROJECTS (MongoDB for creative work) ====================
 class ProjectCreate(BaseModel):
@@ -552,10 +1988,16 @@ class ProjectCreate(BaseModel):
     description: Optional[str] = None
     data: Optional[dict] = None
 
+PROJECT_FIELDS = set(ProjectCreate.model_fields) | {"id", "ownerId", "data_ref", "version", "createdAt", "updatedAt"}
+PROJECT_PATCH_ROOTS = set(ProjectCreate.model_fields)
+
 @app.get("/api/projects")
-async def get_projects(user_id: str):
-    projects = await projects_col.find({"ownerId": user_id}, {"_id": 0}).to_list(100)
-    return projects
+async def get_projects(
+    user_id: str,
+    page: Page = Depends(page_params()),
+    projection: Optional[dict] = Depends(fields_param(PROJECT_FIELDS, "createdAt")),
+):
+    return await paginate(projects_col, {"ownerId": user_id}, page, projection, sort_field="createdAt")
 
 @app.post("/api/projects")
 async def create_project(project: ProjectCreate, user_id: str):
@@ -564,32 +2006,39 @@ async def create_project(project: ProjectCreate, user_id: str):
         "ownerId": user_id,
         "name": project.name,
         "description": project.description,
-        "data": project.data or {},
+        **await spill_payload(project.data or {}),
+        "version": 1,
         "createdAt": datetime.now(timezone.utc).isoformat(),
         "updatedAt": datetime.now(timezone.utc).isoformat()
     }
-    await projects_col.insert_one(doc)
-    return {k: v for k, v in doc.items() if k != "_id"}
+    return await insert_doc(projects_col, doc)
 
 @app.put("/api/projects/{project_id}")
 async def update_project(project_id: str, project: ProjectCreate):
     update_data = {
         "name": project.name,
         "description": project.description,
-        "data": project.data,
+        **await spill_payload(project.data),
         "updatedAt": datetime.now(timezone.utc).isoformat()
     }
-    result = await projects_col.update_one({"id": project_id}, {"$set": update_data})
-    if result.matched_count == 0:
-        raise HTTPException(status_code=404, detail="Project not found")
+    await replace_payload(projects_col, {"id": project_id}, {"$set": update_data, "$inc": {"version": 1}}, "Project")
     return {"message": "Updated"}
 
+@app.patch("/api/projects/{project_id}")
+async def patch_project(project_id: str, patch: PatchRequest):
+    return await apply_patch(projects_col, project_id, patch, PROJECT_PATCH_ROOTS, "Project")
+
+@app.get("/api/projects/{project_id}/data")
+async def get_project_data(project_id: str, request: Request):
+    return await download_payload(projects_col, project_id, request.headers.get("range"), "Project")
+
+@app.put("/api/projects/{project_id}/data")
+async def put_project_data(project_id: str, request: Request, version: Optional[int] = Query(None, ge=0)):
+    return await upload_payload(projects_col, project_id, request, version, "Project")
+
 @app.delete("/api/projects/{project_id}")
 async def delete_project(project_id: str):
-    result = await projects_col.delete_one({"id": project_id})
-    if result.deleted_count == 0:
-        raise HTTPException(status_code=404, detail="Project not found")
-    return {"message": "Deleted"}
+    return await delete_with_payload(projects_col, project_id, "Project")
 
 # ==================== MESSAGES ARCHIVE (MongoDB long-term storage) ====================
 class MessageArchive(BaseModel):
@@ -598,9 +2047,8 @@ class MessageArchive(BaseModel):
     content: str
     metadata: Optional[dict] = None
 
-@app.post("/api/messages/archive")
-async def archive_message(message: MessageArchive):
-    doc = {
+def build_archive_doc(message: MessageArchive) -> dict:
+    return {
         "id": str(uuid.uuid4()),
         "conversationId": message.conversationId,
         "senderId": message.senderId,
@@ -608,15 +2056,109 @@ async def archive_message(message: MessageArchive):
         "metadata": message.metadata or {},
         "createdAt": datetime.now(timezone.utc).isoformat()
     }
-    await messages_archive_col.insert_one(doc)
-    return {k: v for k, v in doc.items() if k != "_id"}
+
+# ARCHIVE_STORAGE=buckets packs each conversation's messages into documents
+# of up to ARCHIVE_BUCKET_SIZE messages from the same UTC day, appended with
+# $push upserts. Existing per-message documents are moved over with
+# `python migrations.py archive_buckets`.
+ARCHIVE_STORAGE = os.environ.get("ARCHIVE_STORAGE", "documents")
+ARCHIVE_BUCKET_SIZE = int(os.environ.get("ARCHIVE_BUCKET_SIZE", "200"))
+archive_buckets_col = db.messages_archive_buckets
+
+def archive_bucket_append(doc: dict) -> UpdateOne:
+    # a full bucket no longer matches, so the upsert opens a new one
+    return UpdateOne(
+        {"conversationId": doc["conversationId"], "day": doc["createdAt"][:10], "count": {"$lt": ARCHIVE_BUCKET_SIZE}},
+        {
+            "$push": {"messages": doc},
+            "$inc": {"count": 1},
+            "$min": {"first": doc["createdAt"]},
+            "$max": {"last": doc["createdAt"]},
+            "$setOnInsert": {"id": str(uuid.uuid4())},
+        },
+        upsert=True,
+    )
+
+async def read_archive_buckets(conversation_id: str, page: Page) -> tuple:
+    """Walk buckets in (day, first) order and keyset-page the messages in them.
+    Buckets from the same day can overlap in time, so reading stops only once
+    the next bucket starts after the last message the page could include."""
+    query = {"conversationId": conversation_id}
+    if page.cursor:
+        created_at, _ = decode_cursor(page.cursor)
+        query["day"] = {"$gte": str(created_at)[:10]}
+    messages, boundary = [], None
+    buckets = archive_buckets_col.find(query, {"_id": 0, "first": 1, "messages": 1}).sort(
+        [("day", ASCENDING), ("first", ASCENDING), ("id", ASCENDING)]
+    )
+    async for bucket in buckets:
+        if boundary is not None and bucket["first"] > boundary:
+            break
+        messages.extend(bucket["messages"])
+        if len(messages) > page.limit:
+            window, _ = page_list(messages, sort_field="createdAt", cursor=page.cursor, limit=page.limit + 1)
+            if len(window) > page.limit:
+                boundary = window[-1]["createdAt"]
+    return page_list(messages, sort_field="createdAt", cursor=page.cursor, limit=page.limit)
+
+@app.post("/api/messages/archive")
+async def archive_message(message: MessageArchive):
+    doc = build_archive_doc(message)
+    if ARCHIVE_STORAGE == "buckets":
+        await archive_buckets_col.bulk_write([archive_bucket_append(doc)])
+        return FastJSONResponse(doc)
+    return await insert_doc(messages_archive_col, doc)
+
+@app.post("/api/messages/archive:batch")
+async def archive_messages_batch(messages: List[dict] = Body(...)):
+    check_batch_size(messages)
+    results = [None] * len(messages)
+    docs = []
+    for index, item in enumerate(messages):
+        try:
+            docs.append((index, build_archive_doc(MessageArchive.model_validate(item))))
+        except ValidationError as e:
+            results[index] = validation_error(e)
+    if ARCHIVE_STORAGE != "buckets":
+        await insert_batch(messages_archive_col, docs, results)
+        return batch_summary(results)
+    if docs:
+        # ordered, so messages land in their buckets in request order
+        failed_at, error = len(docs), None
+        try:
+            await archive_buckets_col.bulk_write([archive_bucket_append(doc) for _, doc in docs], ordered=True)
+        except BulkWriteError as e:
+            write_error = e.details["writeErrors"][0]
+            failed_at, error = write_error["index"], write_error.get("errmsg", "write failed")
+        for pos, (index, doc) in enumerate(docs):
+            if pos < failed_at:
+                results[index] = {"ok": True, "id": doc["id"]}
+            else:
+                results[index] = {"ok": False, "error": error if pos == failed_at else "not attempted"}
+    return batch_summary(results)
+
+ARCHIVE_FIELDS = set(MessageArchive.model_fields) | {"id", "createdAt"}
 
 @app.get("/api/messages/archive/{conversation_id}")
-async def get_archived_messages(conversation_id: str, limit: int = 100):
-    messages = await messages_archive_col.find(
-        {"conversationId": conversation_id}, {"_id": 0}
-    ).sort("createdAt", 1).limit(limit).to_list(limit)
-    return messages
+async def get_archived_messages(
+    conversation_id: str,
+    page: Page = Depends(page_params()),
+    projection: Optional[dict] = Depends(fields_param(ARCHIVE_FIELDS, "createdAt")),
+):
+    if ARCHIVE_STORAGE == "buckets":
+        try:
+            items, next_cursor = await read_archive_buckets(conversation_id, page)
+        except InvalidCursor:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        if projection:
+            # messages come out of the bucket whole; trim after paging
+            items = [{k: v for k, v in item.items() if k in projection} for item in items]
+        headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+        return FastJSONResponse(items, headers=headers)
+    return await paginate(
+        messages_archive_col, {"conversationId": conversation_id}, page, projection,
+        sort_field="createdAt", direction=ASCENDING,
+    )
 
 # ==================== CREATOR ASSETS (MongoDB for creative assets) ====================
 class CreatorAsset(BaseModel):
@@ -624,13 +2166,20 @@ class CreatorAsset(BaseModel):
     name: str
     data: dict
 
+CREATOR_ASSET_FIELDS = set(CreatorAsset.model_fields) | {"id", "ownerId", "data_ref", "version", "createdAt", "updatedAt"}
+CREATOR_ASSET_PATCH_ROOTS = set(CreatorAsset.model_fields)
+
 @app.get("/api/creator-assets")
-async def get_creator_assets(user_id: str, asset_type: Optional[str] = None):
+async def get_creator_assets(
+    user_id: str,
+    asset_type: Optional[str] = None,
+    page: Page = Depends(page_params()),
+    projection: Optional[dict] = Depends(fields_param(CREATOR_ASSET_FIELDS, "createdAt")),
+):
     query = {"ownerId": user_id}
     if asset_type:
         query["type"] = asset_type
-    assets = await creator_assets_col.find(query, {"_id": 0}).to_list(100)
-    return assets
+    return await paginate(creator_assets_col, query, page, projection, sort_field="createdAt")
 
 @app.post("/api/creator-assets")
 async def create_asset(asset: CreatorAsset, user_id: str):
@@ -639,32 +2188,39 @@ async def create_asset(asset: CreatorAsset, user_id: str):
         "ownerId": user_id,
         "type": asset.type,
         "name": asset.name,
-        "data": asset.data,
+        **await spill_payload(asset.data),
+        "version": 1,
         "createdAt": datetime.now(timezone.utc).isoformat(),
         "updatedAt": datetime.now(timezone.utc).isoformat()
     }
-    await creator_assets_col.insert_one(doc)
-    return {k: v for k, v in doc.items() if k != "_id"}
+    return await insert_doc(creator_assets_col, doc)
 
 @app.put("/api/creator-assets/{asset_id}")
 async def update_asset(asset_id: str, asset: CreatorAsset):
     update_data = {
         "type": asset.type,
         "name": asset.name,
-        "data": asset.data,
+        **await spill_payload(asset.data),
         "updatedAt": datetime.now(timezone.utc).isoformat()
     }
-    result = await creator_assets_col.update_one({"id": asset_id}, {"$set": update_data})
-    if result.matched_count == 0:
-        raise HTTPException(status_code=404, detail="Asset not found")
+    await replace_payload(creator_assets_col, {"id": asset_id}, {"$set": update_data, "$inc": {"version": 1}}, "Asset")
     return {"message": "Updated"}
 
+@app.patch("/api/creator-assets/{asset_id}")
+async def patch_asset(asset_id: str, patch: PatchRequest):
+    return await apply_patch(creator_assets_col, asset_id, patch, CREATOR_ASSET_PATCH_ROOTS, "Asset")
+
+@app.get("/api/creator-assets/{asset_id}/data")
+async def get_asset_data(asset_id: str, request: Request):
+    return await download_payload(creator_assets_col, asset_id, request.headers.get("range"), "Asset")
+
+@app.put("/api/creator-assets/{asset_id}/data")
+async def put_asset_data(asset_id: str, request: Request, version: Optional[int] = Query(None, ge=0)):
+    return await upload_payload(creator_assets_col, asset_id, request, version, "Asset")
+
 @app.delete("/api/creator-assets/{asset_id}")
 async def delete_asset(asset_id: str):
-    result = await creator_assets_col.delete_one({"id": asset_id})
-    if result.deleted_count == 0:
-        raise HTTPException(status_code=404, detail="Asset not found")
-    return {"message": "Deleted"}
+    return await delete_with_payload(creator_assets_col, asset_id, "Asset")
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,57 @@
+"""Opt-in streaming for bulk reads.
+
+Clients ask for a stream with ``Accept: application/x-ndjson`` (one document
+per line) or ``?stream=true`` (a single JSON array written incrementally).
+Documents are encoded as the Motor cursor yields them, so server memory stays
+flat however large the collection is.
+"""
+from typing import Optional
+
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+
+from responses import dumps
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+STREAM_BATCH_SIZE = 500
+
+
+def stream_format(request: Request) -> Optional[str]:
+    if NDJSON_MEDIA_TYPE in request.headers.get("accept", ""):
+        return "ndjson"
+    if request.query_params.get("stream", "").lower() in ("1", "true", "json"):
+        return "json"
+    return None
+
+
+async def _ndjson_lines(cursor):
+    async for doc in cursor:
+        yield dumps(doc) + b"\n"
+
+
+async def _json_array(cursor):
+    yield b"["
+    first = True
+    async for doc in cursor:
+        yield dumps(doc) if first else b"," + dumps(doc)
+        first = False
+    yield b"]"
+
+
+async def _iterate(items):
+    for item in items:
+        yield item
+
+
+def stream_documents(cursor, fmt: str) -> StreamingResponse:
+    cursor = cursor.batch_size(STREAM_BATCH_SIZE)
+    if fmt == "ndjson":
+        return StreamingResponse(_ndjson_lines(cursor), media_type=NDJSON_MEDIA_TYPE)
+    return StreamingResponse(_json_array(cursor), media_type="application/json")
+
+
+def stream_items(items, fmt: str) -> StreamingResponse:
+    """Stream documents already held in memory with the same wire formats."""
+    if fmt == "ndjson":
+        return StreamingResponse(_ndjson_lines(_iterate(items)), media_type=NDJSON_MEDIA_TYPE)
+    return StreamingResponse(_json_array(_iterate(items)), media_type="application/json")
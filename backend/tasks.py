@@ -0,0 +1,71 @@
+"""In-process background queue for work that shouldn't hold up a response.
+
+Jobs are coroutine functions run by a fixed number of worker tasks on the
+event loop. The queue is bounded: when it is full the job is dropped and
+counted rather than blocking the request, so only submit work that is safe
+to lose (welcome notifications, cache warming, ...). ``stop`` gives queued
+jobs a grace period to finish on shutdown.
+"""
+import asyncio
+import logging
+from typing import Awaitable, Callable, List
+
+logger = logging.getLogger(__name__)
+
+
+class TaskQueue:
+    def __init__(self, workers: int = 2, max_size: int = 1000):
+        self.workers = workers
+        self.max_size = max_size
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_size)
+        self._workers: List[asyncio.Task] = []
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.dropped = 0
+
+    def submit(self, fn: Callable[..., Awaitable], *args, **kwargs) -> bool:
+        try:
+            self._queue.put_nowait((fn, args, kwargs))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logger.warning("Task queue full, dropping %s", getattr(fn, "__name__", fn))
+            return False
+        self.submitted += 1
+        return True
+
+    async def _work(self):
+        while True:
+            fn, args, kwargs = await self._queue.get()
+            try:
+                await fn(*args, **kwargs)
+                self.completed += 1
+            except Exception:
+                self.failed += 1
+                logger.exception("Background task %s failed", getattr(fn, "__name__", fn))
+            finally:
+                self._queue.task_done()
+
+    def start(self):
+        if not self._workers:
+            self._workers = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self, timeout: float = 5.0):
+        if self._workers:
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout)
+            except asyncio.TimeoutError:
+                logger.warning("Task queue stopped with %d jobs pending", self._queue.qsize())
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize(),
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "dropped": self.dropped,
+        }
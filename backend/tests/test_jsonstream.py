@@ -0,0 +1,86 @@
+"""JSONObjectValidator must accept exactly the bodies orjson parses to an object."""
+import random
+
+import orjson
+import pytest
+
+from jsonstream import InvalidJSON, JSONObjectValidator
+
+CHUNK_SIZES = (1, 2, 3, 5, 7, 1000)
+
+
+def validates(body: bytes, chunk_size: int) -> bool:
+    validator = JSONObjectValidator()
+    try:
+        for i in range(0, len(body), chunk_size):
+            validator.feed(body[i:i + chunk_size])
+        validator.close()
+    except InvalidJSON:
+        return False
+    return True
+
+
+def orjson_object(body: bytes) -> bool:
+    try:
+        return isinstance(orjson.loads(body), dict)
+    except orjson.JSONDecodeError:
+        return False
+
+
+CASES = [
+    b"{}",
+    b' { "a" : [ 1 , 2 , "x" ] , "b" : { "c" : null } } ',
+    b'{"k": [0.5, "\\u00e9\\"x", null, true, {"z": -3, "w": [1, "a", false]}], "m": 1.5e10}',
+    b"[]",
+    b'"x"',
+    b"{} {}",
+    b'{"a": 1',
+    b'{"a": 01}',
+    b'{"a": 1e999}',
+    b'{"a": -1e-999}',
+    b'{"a": tru}',
+    b'{"a": "\x01"}',
+    b'{"a": "\xc3"}',
+    b'{"a": "\\x"}',
+    # surrogate pairs and unpaired surrogates
+    b'{"a": "\\ud83d\\ude00"}',
+    b'{"a": "\\uD800\\uDC00", "b": "\\udbff\\udfff"}',
+    b'{"a": "\\ud7ff\\ue000"}',
+    b'{"a": "\\ud83d"}',
+    b'{"a": "\\ude00"}',
+    b'{"a": "\\ud83dx"}',
+    b'{"a": "\\ud83d\\u0041"}',
+    b'{"a": "\\ud83d\\ud83d"}',
+    b'{"\\ud83d": 1}',
+    b'{"a": ["\\udfff"]}',
+]
+
+
+@pytest.mark.parametrize("body", CASES)
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+def test_matches_orjson(body, chunk_size):
+    assert validates(body, chunk_size) == orjson_object(body)
+
+
+def test_matches_orjson_on_mutations():
+    rng = random.Random(2)
+    alphabet = list(b' {}[]:,"\\u0123456789abcdefABCDEF-+.eEtrunlsx\n\t\x01') + [0xC3, 0xA9]
+    bases = [case for case in CASES if orjson_object(case)]
+    for _ in range(20000):
+        body = bytearray(rng.choice(bases))
+        for _ in range(rng.randint(1, 3)):
+            i = rng.randrange(len(body) + 1)
+            if rng.random() < 0.4 and body:
+                del body[min(i, len(body) - 1)]
+            else:
+                body[i:i] = bytes([rng.choice(alphabet)])
+        body = bytes(body)
+        chunk_size = rng.choice(CHUNK_SIZES)
+        assert validates(body, chunk_size) == orjson_object(body), (body, chunk_size)
+
+
+def test_large_body():
+    body = orjson.dumps({"layers": [{"id": i, "name": f"layer {i}", "pts": list(range(20))} for i in range(2000)],
+                         "img": "A" * 1_000_000})
+    assert validates(body, 65536)
+    assert not validates(body[:-1], 65536)